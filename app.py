@@ -1,18 +1,27 @@
-from flask import Flask, request, send_file, jsonify, render_template
+from flask import Flask, Request, current_app, request, send_file, jsonify, render_template, Response, stream_with_context
 from flask_cors import CORS
 import os
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import io
-from openpyxl import load_workbook
-from pptx import Presentation
-from pptx.util import Inches
-from docx import Document
-from reportlab.lib.pagesizes import letter, A4, landscape
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
-from PIL import Image
+import json
+import queue
+import threading
+import functools
+import concurrent.futures
+import shutil
+import uuid
+import zipfile
+import time
+import cProfile
+import pstats
+from jobs import ConversionPool, QueueFullError
+from cache import ConversionCache, cache_hasher
+from pdfmerge import PageRangeError, merge_pdfs, select_pages
+from sniff import RejectedUpload, check_zip_entries, sniff_upload
+from metrics import MetricsRegistry, collect_stages, size_class, stage
+from converters import PART_PLANNERS, get_converter, plan_parts, warm_converters, converter_modules
+from converters.quality import DEFAULT_QUALITY, QUALITY_PRESETS, optimize_pdf, use_quality
 import tempfile
 import os
 
@@ -20,8 +29,94 @@ app = Flask(__name__)
 CORS(app)
 
 # Configuration
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 512 * 1024 * 1024))  # 512MB max upload size
+app.config['UPLOAD_SPOOL_THRESHOLD'] = 1 * 1024 * 1024  # Parse uploads larger than 1MB straight to disk
+app.config['ASGI_THREADS'] = int(os.environ.get('ASGI_THREADS', 32))  # Threads running views under asgi.py; slow clients never hold one
+app.config['MAX_UNCOMPRESSED_BYTES'] = int(os.environ.get('MAX_UNCOMPRESSED_BYTES', 2 * 1024 * 1024 * 1024))  # Largest size a ZIP upload may expand to
+app.config['MAX_ZIP_ENTRIES'] = int(os.environ.get('MAX_ZIP_ENTRIES', 20000))  # Most entries a ZIP upload may hold
+app.config['MAX_COMPRESSION_RATIO'] = int(os.environ.get('MAX_COMPRESSION_RATIO', 200))  # Per entry over 1MB; Office files stay below 50:1
+app.config['SPOOL_DIR'] = os.environ.get('SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'pdfconverter-spool'))  # Uploads and PDFs in flight
+app.config['EXCEL_STREAMING_THRESHOLD'] = 1 * 1024 * 1024  # Stream workbooks larger than 1MB
+app.config['TEXT_FAST_PATH_THRESHOLD'] = 256 * 1024  # Draw text files larger than 256KB without Platypus
+app.config['PARALLEL_RENDERING'] = os.environ.get('PARALLEL_RENDERING') == '1'  # Render sheets/slide ranges in parallel unless ?parallel=0
+app.config['CONVERSION_WORKERS'] = int(os.environ.get('CONVERSION_WORKERS', os.cpu_count() or 1))  # 0 converts inline
+app.config['CONVERSION_QUEUE_SIZE'] = int(os.environ.get('CONVERSION_QUEUE_SIZE', 16))  # Waiting jobs before HTTP 429
+app.config['JOB_RESULT_TTL'] = int(os.environ.get('JOB_RESULT_TTL', 600))  # Seconds finished jobs are kept
+app.config['CACHE_MEMORY_BYTES'] = int(os.environ.get('CACHE_MEMORY_BYTES', 64 * 1024 * 1024))  # In-process LRU tier
+app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pdfconverter-cache'))  # Shared disk tier
+app.config['CACHE_DISK_BYTES'] = int(os.environ.get('CACHE_DISK_BYTES', 1024 * 1024 * 1024))  # 0 disables the disk tier
+app.config['CACHE_TTL'] = int(os.environ.get('CACHE_TTL', 24 * 60 * 60))  # Seconds an unused result is kept
+app.config['INCREMENTAL_EXCEL'] = os.environ.get('INCREMENTAL_EXCEL', '1') == '1'  # Render multi-sheet workbooks sheet by sheet, reusing unchanged sheets
+app.config['FRAGMENT_CACHE_MEMORY_BYTES'] = int(os.environ.get('FRAGMENT_CACHE_MEMORY_BYTES', 32 * 1024 * 1024))  # Per conversion worker
+app.config['FRAGMENT_CACHE_DIR'] = os.environ.get('FRAGMENT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pdfconverter-fragments'))  # Shared by all workers
+app.config['FRAGMENT_CACHE_DISK_BYTES'] = int(os.environ.get('FRAGMENT_CACHE_DISK_BYTES', 1024 * 1024 * 1024))  # 0 keeps fragments in worker memory only
+app.config['THUMBNAIL_WIDTH'] = 320  # Pixel width of ?output=thumbnails page images
+app.config['PREVIEW_WIDTH'] = 480  # Pixel width of the /preview image of page one
+app.config['THEMES_FILE'] = os.environ.get('THEMES_FILE')  # JSON file of named style themes for ?theme=
+app.config['PDF_QUALITY'] = os.environ.get('PDF_QUALITY', DEFAULT_QUALITY)  # Preset used without ?quality=
 ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'xlsm', 'pptx', 'ppt', 'docx', 'doc', 'txt'}
+# Converter variants a request may pick with ?mode=, by file type
+CONVERSION_MODES = {'powerpoint': {'faithful'}}
+PROFILE_STATS_LIMIT = 40  # Functions listed in a ?profile=1 summary
+SPOOL_CHUNK_SIZE = 1024 * 1024  # Bytes copied at a time between uploads, spool files and the cache
+BATCH_MANIFEST_HEADER_BYTES = 4096  # Longer manifests of merged batches are cut to counts; proxies cap headers near 8KB
+
+# Stage timings are collected in the worker that converts and recorded here
+metrics_registry = MetricsRegistry()
+STAGE_SECONDS = metrics_registry.histogram(
+    'conversion_stage_seconds',
+    'Time spent in each stage of a conversion',
+    ['stage', 'file_type', 'size'],
+)
+
+# Bump a converter's version whenever its output changes so cached PDFs are not reused
+CONVERTER_VERSIONS = {'excel': 7, 'powerpoint': 5, 'word': 4, 'text': 3}
+
+# Created lazily so importing the app never starts processes or touches the disk
+_conversion_pool = None
+_result_cache = None
+_fragment_cache = None
+_themes = None
+
+class SpoolingRequest(Request):
+    """Request that parses file uploads into the spool directory rather than memory"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        threshold = current_app.config['UPLOAD_SPOOL_THRESHOLD']
+        if total_content_length is not None and total_content_length > threshold:
+            # A named file lets spool_upload() hard-link the upload instead of copying it
+            return tempfile.NamedTemporaryFile('rb+', dir=get_spool_dir(), suffix='.part')
+        return tempfile.SpooledTemporaryFile(max_size=threshold, mode='rb+', dir=get_spool_dir())
+
+app.request_class = SpoolingRequest
+
+class CallbackFile:
+    """Binary file wrapper that runs a callback the first time it is closed"""
+
+    def __init__(self, file, on_close):
+        self._file = file
+        self._on_close = on_close
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def close(self):
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            try:
+                on_close()
+            except Exception as e:
+                print(f"Error in close callback: {e}")
+        self._file.close()
+
+def get_file_size(file):
+    """Return the size of a seekable file or upload in bytes without reading it"""
+    stream = getattr(file, 'stream', file)
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -39,406 +134,635 @@ def get_file_type(filename):
         return 'text'
     return None
 
-def excel_to_pdf(excel_file):
-    """Convert Excel file to PDF"""
-    # Load the workbook
-    wb = load_workbook(excel_file, data_only=True)
-    
-    # Determine orientation based on data width
-    # First, check how many columns we have
-    max_cols_in_any_sheet = 0
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-        for row in ws.iter_rows(values_only=True):
-            max_cols_in_any_sheet = max(max_cols_in_any_sheet, len([c for c in row if c is not None]))
-    
-    # Use landscape for sheets with more than 8 columns, portrait otherwise
-    use_landscape = max_cols_in_any_sheet > 8
-    pagesize = landscape(A4) if use_landscape else A4
-    
-    # Create PDF in memory with appropriate orientation
-    pdf_buffer = io.BytesIO()
-    doc = SimpleDocTemplate(pdf_buffer, pagesize=pagesize, leftMargin=0.25*inch, rightMargin=0.25*inch, topMargin=0.25*inch, bottomMargin=0.25*inch)
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Process each sheet
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-        
-        # Add sheet name as header
-        if len(wb.sheetnames) > 1:
-            header = Paragraph(f"<b>{sheet_name}</b>", styles['Heading2'])
-            elements.append(header)
-            elements.append(Spacer(1, 0.1*inch))
-        
-        # Get data from sheet
-        data = []
-        for row in ws.iter_rows(values_only=True):
-            # Convert None to empty string and all values to strings
-            row_data = [str(cell) if cell is not None else '' for cell in row]
-            data.append(row_data)
-        
-        if data:
-            # Remove completely empty rows at the end
-            while data and all(cell == '' for cell in data[-1]):
-                data.pop()
-            
-            # Remove completely empty columns at the end
-            if data:
-                max_cols = max(len(row) for row in data)
-                for row in data:
-                    while len(row) < max_cols:
-                        row.append('')
-                
-                # Find and remove completely empty trailing columns
-                while max_cols > 0:
-                    if all(row[max_cols-1] == '' for row in data):
-                        for row in data:
-                            if len(row) > max_cols - 1:
-                                row.pop()
-                        max_cols -= 1
-                    else:
-                        break
-            
-            if data and any(any(cell != '' for cell in row) for row in data):
-                max_cols = max(len(row) for row in data) if data else 0
-                
-                if max_cols > 0:
-                    # Calculate optimal column widths based on page orientation
-                    if use_landscape:
-                        available_width = landscape(A4)[0] - 0.5*inch
-                    else:
-                        available_width = A4[0] - 0.5*inch
-                    
-                    col_width = available_width / max_cols
-                    
-                    # Limit minimum column width to ensure readability
-                    min_col_width = 0.35*inch
-                    if col_width < min_col_width:
-                        col_width = min_col_width
-                    
-                    col_widths = [col_width] * max_cols
-                    
-                    # Create table
-                    table = Table(data, colWidths=col_widths)
-                    
-                    # Style the table
-                    table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 7),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 5),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#D9E2F3')),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#A6B4D0')),
-                        ('FONTSIZE', (0, 1), (-1, -1), 5),
-                        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#E7EEF7')]),
-                    ]))
-                    
-                    elements.append(table)
-                    elements.append(Spacer(1, 0.15*inch))
-    
-    # Build PDF
-    if not elements:
-        elements.append(Paragraph("No data found in the spreadsheet.", styles['Normal']))
-    
-    doc.build(elements)
-    pdf_buffer.seek(0)
-    
-    return pdf_buffer
-
-def pptx_to_pdf(pptx_file):
-    """Convert PowerPoint file to PDF with images"""
+def get_spool_dir():
+    """Return the directory for uploads and PDFs in flight, creating it if needed"""
+    spool_dir = app.config['SPOOL_DIR']
+    os.makedirs(spool_dir, exist_ok=True)
+    return spool_dir
+
+def new_spool_path(suffix):
+    """Reserve a new file name in the spool directory"""
+    fd, path = tempfile.mkstemp(dir=get_spool_dir(), suffix=suffix)
+    os.close(fd)
+    return path
+
+def remove_file(path):
+    """Delete a spool file, ignoring one that is already gone"""
     try:
-        # Load the presentation
-        prs = Presentation(pptx_file)
-        
-        # Create PDF in memory
-        pdf_buffer = io.BytesIO()
-        doc = SimpleDocTemplate(pdf_buffer, pagesize=A4)
-        
-        elements = []
-        styles = getSampleStyleSheet()
-        temp_files = []  # Keep track of all temp files
-        
-        # Get page dimensions
-        page_width = A4[0] - 2*inch  # Leave 1 inch margin on each side
-        
-        # Process each slide
-        for slide_idx, slide in enumerate(prs.slides, 1):
-            try:
-                # Add slide number header
-                header = Paragraph(f"<b>Slide {slide_idx}</b>", styles['Heading2'])
-                elements.append(header)
-                elements.append(Spacer(1, 0.15*inch))
-                
-                # Extract and add images from slide
-                slide_has_images = False
-                
-                for shape in slide.shapes:
-                    try:
-                        if hasattr(shape, "image"):
-                            # Get the image
-                            image = shape.image
-                            image_bytes = image.blob
-                            
-                            # Save to temporary file
-                            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{image.ext}') as tmp_file:
-                                tmp_file.write(image_bytes)
-                                tmp_path = tmp_file.name
-                            
-                            temp_files.append(tmp_path)  # Track temp file
-                            
-                            try:
-                                # Open with PIL to get dimensions and ensure it's valid
-                                pil_img = Image.open(tmp_path)
-                                img_width, img_height = pil_img.size
-                                pil_img.close()
-                                
-                                # Calculate scaling to fit page width while maintaining aspect ratio
-                                aspect = img_height / float(img_width)
-                                display_width = min(page_width, 5*inch)  # Max 5 inches wide
-                                display_height = display_width * aspect
-                                
-                                # Add image to PDF - use the temp path directly
-                                img = RLImage(tmp_path, width=display_width, height=display_height)
-                                elements.append(img)
-                                elements.append(Spacer(1, 0.1*inch))
-                                slide_has_images = True
-                            except Exception as e:
-                                print(f"Error processing image in slide {slide_idx}: {e}")
-                                continue
-                    
-                    except Exception as e:
-                        print(f"Error extracting image from shape: {e}")
-                        continue
-                
-                # Extract text from shapes
-                slide_text = []
-                for shape in slide.shapes:
-                    try:
-                        if hasattr(shape, "text") and shape.text.strip():
-                            slide_text.append(shape.text.strip())
-                    except Exception as e:
-                        print(f"Error extracting text from shape: {e}")
-                        continue
-                
-                # Add text content
-                if slide_text:
-                    for text in slide_text:
-                        try:
-                            # Clean and format text
-                            text = text.replace('\r\n', '<br/>').replace('\n', '<br/>')
-                            para = Paragraph(text, styles['Normal'])
-                            elements.append(para)
-                            elements.append(Spacer(1, 0.1*inch))
-                        except Exception as e:
-                            print(f"Error adding text to PDF: {e}")
-                            continue
-                elif not slide_has_images:
-                    # If no text and no images, add placeholder
-                    para = Paragraph("<i>[Empty slide]</i>", styles['Normal'])
-                    elements.append(para)
-                    elements.append(Spacer(1, 0.1*inch))
-                
-                # Add page break between slides (except last one)
-                if slide_idx < len(prs.slides):
-                    elements.append(PageBreak())
-            
-            except Exception as e:
-                print(f"Error processing slide {slide_idx}: {e}")
-                continue
-        
-        # Build PDF
-        if not elements:
-            # If no elements were added, add a message
-            elements.append(Paragraph("No content could be extracted from the presentation.", styles['Normal']))
-        
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def spool_upload(file, file_type, *key_parts):
+    """Save an upload where pool workers can open it and return (path, size, cache key).
+
+    The upload is hashed chunk by chunk while it is copied, or hard-linked
+    when SpoolingRequest already parsed it to a file in the spool directory.
+    key_parts are extra conversion options that change the output.
+    """
+    return spool_stream(file.stream, file_type, *key_parts)
+
+def spool_stream(stream, file_type, *key_parts):
+    """Copy a readable stream, such as an upload or a ZIP entry, to the spool directory; see spool_upload()"""
+    digest = cache_hasher(file_type, CONVERTER_VERSIONS[file_type], *key_parts)
+    if stream.seekable():
+        stream.seek(0)
+    
+    output = None
+    path = None
+    if is_spool_file(stream):
+        source = stream.name
+        path = os.path.join(get_spool_dir(), uuid.uuid4().hex + '.upload')
         try:
-            doc.build(elements)
-        except Exception as e:
-            print(f"Error building PDF: {e}")
-            raise
-        
-        pdf_buffer.seek(0)
-        
-        # Clean up temp files after PDF is built
-        for tmp_path in temp_files:
-            try:
-                if os.path.exists(tmp_path):
-                    os.unlink(tmp_path)
-            except Exception as e:
-                print(f"Error deleting temp file {tmp_path}: {e}")
-        
-        return pdf_buffer
+            os.link(source, path)
+        except OSError:
+            path = None
+    if path is None:
+        path = new_spool_path('.upload')
+        output = open(path, 'wb')
     
-    except Exception as e:
-        print(f"Fatal error in pptx_to_pdf: {e}")
+    size = 0
+    try:
+        chunk = stream.read(SPOOL_CHUNK_SIZE)
+        while chunk:
+            digest.update(chunk)
+            size += len(chunk)
+            if output is not None:
+                output.write(chunk)
+            chunk = stream.read(SPOOL_CHUNK_SIZE)
+    except Exception:
+        remove_file(path)
         raise
+    finally:
+        if output is not None:
+            output.close()
+    return path, size, digest.hexdigest()
 
-def docx_to_pdf(docx_file):
-    """Convert Word document to PDF"""
+def is_spool_file(stream):
+    """Whether stream is an open file in the spool directory, which can be hard-linked rather than copied"""
+    source = getattr(stream, 'name', None)
+    if not isinstance(source, str) or os.path.dirname(source) != get_spool_dir():
+        return False
     try:
-        # Load the document
-        doc = Document(docx_file)
-        
-        # Create PDF in memory
-        pdf_buffer = io.BytesIO()
-        pdf_doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, leftMargin=0.75*inch, rightMargin=0.75*inch, topMargin=0.75*inch, bottomMargin=0.75*inch)
-        
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Get styles
-        title_style = styles['Heading1']
-        heading_style = styles['Heading2']
-        body_style = styles['Normal']
+        # A ZIP entry's name is not a path, whatever it looks like
+        return os.path.samestat(os.fstat(stream.fileno()), os.stat(source))
+    except (OSError, ValueError):
+        return False
+
+def convert_file(file_type, file, output=None, part=None, variant=None, max_rows=None):
+    """Run the converter matching file_type and return the PDF output (a new buffer by default).
+
+    part limits the conversion to one part from plan_parts() or, for
+    presentations, a (first, last) slide range. variant picks a requested
+    converter mode; otherwise one is chosen from the file's size. max_rows
+    limits each Excel sheet to that many rows below its header.
+    """
+    if variant is None and file_type == 'excel' and get_file_size(file) > app.config['EXCEL_STREAMING_THRESHOLD']:
+        # Large workbooks go through the constant-memory streaming path
+        variant = 'streaming'
+    elif variant is None and file_type == 'text' and get_file_size(file) > app.config['TEXT_FAST_PATH_THRESHOLD']:
+        # Large text files skip Platypus and are drawn directly onto the canvas
+        variant = 'fast'
+    converter = get_converter(file_type, variant)
+    kwargs = {}
+    if part is not None:
+        kwargs['part'] = part
+    if max_rows is not None:
+        kwargs['max_rows'] = max_rows
+    return converter(file, output, **kwargs)
+
+def run_conversion(file_type, source, output, profile=False, part=None, options=None):
+    """Convert source into output, returning stage timings and an optional cProfile summary.
+
+    options is the dict from conversion_options(): the converter variant, the
+    style theme, the quality preset, any page, slide or row limits, and
+    whether workbooks reuse cached sheets. A whole-file conversion also drops
+    pages before the requested range and runs the preset's optimizing
+    post-pass, which needs output to be readable.
+    """
+    # Imported here so the web process never loads reportlab just to start
+    from converters.common import use_fragment_cache, use_page_limit
+    from converters.styles import use_theme
+    
+    options = options or {}
+    whole_file = part is None
+    if whole_file and options.get('slides'):
+        part = options['slides']
+    pages = options.get('pages')
+    profiler = cProfile.Profile() if profile else None
+    fragments = None
+    if whole_file and options.get('incremental'):
+        fragments = get_fragment_cache()
+    fragment_key_parts = [file_type, CONVERTER_VERSIONS[file_type]] + options_key_parts(options, False)
+    with collect_stages() as timings, use_theme(options.get('theme')), use_quality(options.get('quality')), \
+            use_page_limit(pages[1] if pages else None), use_fragment_cache(fragments, fragment_key_parts):
+        if profiler:
+            profiler.enable()
+        try:
+            convert_file(file_type, source, output, part, options.get('variant'), options.get('max_rows'))
+            if whole_file:
+                if pages and pages[0] > 1:
+                    with stage('select_pages'):
+                        select_pages(output, pages[0], pages[1])
+                optimize_output(output, options)
+        finally:
+            if profiler:
+                profiler.disable()
+    
+    summary = None
+    if profiler:
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_STATS_LIMIT)
+        summary = stream.getvalue()
+    
+    return {'timings': timings, 'profile': summary}
+
+def convert_path(file_type, input_path, output_path, profile=False, part=None, options=None):
+    """Convert a spooled upload in a pool worker, writing the PDF to output_path.
+
+    Only paths cross the process boundary, so neither the upload nor the PDF
+    is ever held in memory as a whole by the web process.
+    """
+    with open(input_path, 'rb') as source, open(output_path, 'wb+') as output:
+        result = run_conversion(file_type, source, output, profile, part, options)
+    result['pdf_path'] = output_path
+    return result
+
+def plan_path_parts(file_type, input_path, max_parts):
+    """List the independently renderable parts of a spooled upload in a pool worker"""
+    with open(input_path, 'rb') as source:
+        return plan_parts(file_type, source, max_parts)
+
+def merge_path_parts(part_paths, output_path, options=None):
+    """Merge part PDFs into output_path in a pool worker, keeping each part's bookmarks.
+
+    Returns the timings of the merge and of any optimizing post-pass.
+    """
+    with collect_stages() as timings, open(output_path, 'wb+') as output:
+        with stage('merge'):
+            merge_pdfs([(None, part_path) for part_path in part_paths], output)
+        optimize_output(output, options or {})
+    return timings
+
+def optimize_output(output, options):
+    """Rewrite a finished PDF if its quality preset or ?linearize=1 asks for the post-pass"""
+    if QUALITY_PRESETS[options.get('quality') or DEFAULT_QUALITY]['optimize'] or options.get('linearize'):
+        with stage('optimize'):
+            optimize_pdf(output, linearize=options.get('linearize', False))
+
+def convert_path_parallel(file_type, input_path, output_path, options=None, block=False):
+    """Render a spooled upload's sheets or slide ranges side by side on the pool and merge them.
+
+    Runs in the web process and returns the same dict as convert_path; each
+    stage's timing is that of its slowest part. Files that do not split
+    into several parts are converted in one piece. Without block, planning
+    the parts raises QueueFullError when the pool is full; with it, as in
+    job coordinators, every step waits for a free slot.
+    """
+    pool = get_conversion_pool()
+    parts = pool.run(plan_path_parts, file_type, input_path, max(pool.max_workers, 1), block=block)
+    if len(parts) < 2:
+        return pool.run(convert_path, file_type, input_path, output_path, False, None, options, block=True)
+    
+    part_paths = [new_spool_path('.pdf') for _ in parts]
+    try:
+        # Wait for free slots so a large file queues behind its own parts instead of failing
+        futures = [
+            pool.dispatch(convert_path, file_type, input_path, part_path, False, part, options, block=True)
+            for part_path, part in zip(part_paths, parts)
+        ]
+        concurrent.futures.wait(futures)
+        timings = {}
+        for future in futures:
+            for name, seconds in future.result()['timings'].items():
+                timings[name] = max(timings.get(name, 0.0), seconds)
         
-        # Process paragraphs
-        for para in doc.paragraphs:
+        timings.update(pool.dispatch(merge_path_parts, part_paths, output_path, options, block=True).result())
+    finally:
+        for part_path in part_paths:
+            remove_file(part_path)
+    return {'timings': timings, 'profile': None, 'pdf_path': output_path}
+
+def render_thumbnails(pdf_path, zip_path, width):
+    """Write a PNG of every page of a PDF into a ZIP at zip_path, in a pool worker"""
+    # Imported here so only thumbnail requests pay for loading pdfium
+    from converters.raster import pdf_to_pngs
+    
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as archive:
+        for page_number, png in pdf_to_pngs(pdf_path, width):
+            archive.writestr(f'page-{page_number:03d}.png', png)
+
+def render_preview(file_type, input_path, png_path, width, options):
+    """Convert only the first requested page of a spooled upload and write it as a PNG to png_path, in a pool worker.
+
+    The converters stop once that page is laid out, so a long document
+    previews about as fast as a short one.
+    """
+    from converters.raster import pdf_to_pngs
+    
+    first_page = options['pages'][0] if options.get('pages') else 1
+    options = dict(options, pages=(first_page, first_page), quality='fast', linearize=False)
+    pdf = io.BytesIO()
+    with open(input_path, 'rb') as source:
+        result = run_conversion(file_type, source, pdf, options=options)
+    rasterize_start = time.perf_counter()
+    for _, png in pdf_to_pngs(pdf, width, pages=[1]):
+        with open(png_path, 'wb') as output:
+            output.write(png)
+    result['timings']['rasterize'] = time.perf_counter() - rasterize_start
+    return result
+
+def thumbnails_zip(pdf_file, thumbnails_key):
+    """Rasterize an open PDF to a ZIP of page PNGs on the pool, cache it and return it open"""
+    pdf_path = new_spool_path('.pdf')
+    zip_path = new_spool_path('.zip')
+    try:
+        with pdf_file, open(pdf_path, 'wb') as output:
+            shutil.copyfileobj(pdf_file, output, SPOOL_CHUNK_SIZE)
+        get_conversion_pool().run(render_thumbnails, pdf_path, zip_path, app.config['THUMBNAIL_WIDTH'])
+        get_result_cache().put_file(thumbnails_key, zip_path)
+        return open(zip_path, 'rb')
+    finally:
+        remove_file(pdf_path)
+        remove_file(zip_path)
+
+def conversion_options(file_type, profile=False):
+    """Read ?mode=, ?theme=, ?quality=, ?linearize=, ?pages=, ?slides=, ?max_rows= and ?parallel= for an upload.
+
+    Returns (options, parallel, error response).
+    """
+    mode = request.args.get('mode')
+    if mode is not None and mode not in CONVERSION_MODES.get(file_type, ()):
+        return None, False, (jsonify({'error': f'Unsupported mode for {file_type} files: {mode}'}), 400)
+    theme, error = theme_option()
+    if error:
+        return None, False, error
+    quality = request.args.get('quality', app.config['PDF_QUALITY'])
+    if quality not in QUALITY_PRESETS:
+        return None, False, (jsonify({'error': f'quality must be one of: {", ".join(QUALITY_PRESETS)}'}), 400)
+    pages, error = range_option('pages')
+    if error:
+        return None, False, error
+    slides, error = range_option('slides')
+    if error:
+        return None, False, error
+    if slides and file_type != 'powerpoint':
+        return None, False, (jsonify({'error': 'slides is only supported for PowerPoint files'}), 400)
+    max_rows = request.args.get('max_rows')
+    if max_rows is not None:
+        if file_type != 'excel':
+            return None, False, (jsonify({'error': 'max_rows is only supported for Excel files'}), 400)
+        if not max_rows.isdigit() or int(max_rows) < 1:
+            return None, False, (jsonify({'error': 'max_rows must be a positive whole number'}), 400)
+        max_rows = int(max_rows)
+    options = {
+        'variant': mode,
+        'theme': theme,
+        'quality': quality,
+        'linearize': request.args.get('linearize') == '1',
+        'pages': pages,
+        'slides': slides,
+        'max_rows': max_rows,
+        # Ranged conversions read only part of a workbook, so they cannot be fingerprinted
+        'incremental': file_type == 'excel' and app.config['INCREMENTAL_EXCEL'] and not (pages or max_rows),
+    }
+    # Limited conversions stop early in a single process instead of rendering every part
+    parallel = wants_parallel(file_type, profile) and not (pages or slides or max_rows)
+    return options, parallel, None
+
+def range_option(name):
+    """Read a ?<name>=N or ?<name>=N-M range and return ((first, last) or None, error response)"""
+    value = request.args.get(name)
+    if value is None:
+        return None, None
+    first, _, last = value.partition('-')
+    last = last or first
+    if not (first.isdigit() and last.isdigit()) or not 1 <= int(first) <= int(last):
+        return None, (jsonify({'error': f'{name} must be a number or a range like 1-3'}), 400)
+    return (int(first), int(last)), None
+
+def theme_option():
+    """Read ?theme= and return (the named theme's settings or None, error response)"""
+    name = request.args.get('theme')
+    if name is None:
+        return None, None
+    theme = get_themes().get(name)
+    if theme is None:
+        return None, (jsonify({'error': f'Unknown theme: {name}'}), 400)
+    return theme, None
+
+def get_themes():
+    """Return the named themes from THEMES_FILE, read once per process"""
+    global _themes
+    if _themes is None:
+        themes_file = app.config['THEMES_FILE']
+        if themes_file:
+            with open(themes_file, encoding='utf-8') as f:
+                _themes = json.load(f)
+        else:
+            _themes = {}
+    return _themes
+
+def options_key_parts(options, parallel):
+    """Cache key parts for conversion options that change the output.
+
+    A theme is keyed on its settings rather than its name, so editing
+    THEMES_FILE never serves PDFs styled with the old settings. Parallel
+    output starts every part on a new page, so it is cached apart from
+    serial conversions.
+    """
+    theme = options.get('theme')
+    quality = options.get('quality') or DEFAULT_QUALITY
+    return [part for part in (
+        options.get('variant'),
+        'theme:' + json.dumps(theme, sort_keys=True) if theme else None,
+        'quality:' + quality if quality != DEFAULT_QUALITY else None,
+        'linearized' if options.get('linearize') else None,
+        'pages:%d-%d' % options['pages'] if options.get('pages') else None,
+        'slides:%d-%d' % options['slides'] if options.get('slides') else None,
+        'max_rows:%d' % options['max_rows'] if options.get('max_rows') else None,
+        'incremental' if options.get('incremental') else None,
+        'parallel' if parallel else None,
+    ) if part]
+
+def wants_parallel(file_type, profile=False):
+    """Whether this request renders in parallel: ?parallel=1, or PARALLEL_RENDERING unless ?parallel=0"""
+    default = '1' if app.config['PARALLEL_RENDERING'] else '0'
+    if request.args.get('parallel', default) != '1' or profile:
+        # A profile covers a single process, so profiled conversions never split
+        return False
+    return file_type in PART_PLANNERS and app.config['CONVERSION_WORKERS'] > 1
+
+def record_stage_metrics(file_type, size, timings):
+    """Add one conversion's stage timings to the /metrics histograms"""
+    for name, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage=name, file_type=file_type, size=size_class(size))
+
+def pdf_quality_header(quality, size, seconds=None):
+    """Format the quality preset, PDF size and conversion time (None for cached PDFs) as a header value"""
+    value = f'{quality}; bytes={size}'
+    if seconds is not None:
+        value += f'; seconds={seconds:.3f}'
+    return value
+
+def server_timing_header(timings):
+    """Format stage timings as a Server-Timing header value"""
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items())
+
+def get_conversion_pool():
+    """Return the process-wide conversion pool, creating it on first use"""
+    global _conversion_pool
+    if _conversion_pool is None:
+        _conversion_pool = ConversionPool(
+            app.config['CONVERSION_WORKERS'],
+            app.config['CONVERSION_QUEUE_SIZE'],
+            result_ttl=app.config['JOB_RESULT_TTL'],
+            initializer=warm_converters,
+            # Workers unpickle convert_path from this module, so preload it along with the converters
+            preload=[__name__] + converter_modules(),
+        )
+    return _conversion_pool
+
+def warm_up():
+    """Load the converters and start the pool's workers ahead of the first request.
+
+    With CONVERSION_WORKERS=0 this warms the converters in this process instead.
+    """
+    get_conversion_pool().start()
+
+def get_result_cache():
+    """Return the process-wide conversion result cache, creating it on first use"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ConversionCache(
+            app.config['CACHE_MEMORY_BYTES'],
+            disk_dir=app.config['CACHE_DIR'],
+            disk_bytes=app.config['CACHE_DISK_BYTES'],
+            ttl=app.config['CACHE_TTL'],
+        )
+    return _result_cache
+
+def get_fragment_cache():
+    """Return this process's cache of per-sheet PDF fragments, creating it on first use.
+
+    Each conversion worker has its own memory tier; the disk tier is shared.
+    """
+    global _fragment_cache
+    if _fragment_cache is None:
+        _fragment_cache = ConversionCache(
+            app.config['FRAGMENT_CACHE_MEMORY_BYTES'],
+            disk_dir=app.config['FRAGMENT_CACHE_DIR'],
+            disk_bytes=app.config['FRAGMENT_CACHE_DISK_BYTES'],
+            ttl=app.config['CACHE_TTL'],
+        )
+    return _fragment_cache
+
+def read_batch_uploads(files, *key_parts):
+    """Spool uploaded files, expanding ZIP archives, and return (filename, spooled, error) triples.
+
+    spooled is the (path, size, cache key) from spool_stream(), or None
+    along with an error for a bad archive, an archive over the upload
+    limits or an unsupported file. ZIP entries are copied to disk one chunk
+    at a time and never inflated in memory. The spooled files belong to
+    convert_batch() once it starts; until then the caller removes them.
+    """
+    items = []
+    
+    def add(filename, stream):
+        if not allowed_file(filename):
+            items.append((filename, None, 'Unsupported file type'))
+            return
+        items.append((filename, spool_stream(stream, get_file_type(filename), *key_parts), None))
+    
+    try:
+        for file in files:
+            if file.filename == '':
+                continue
+            if not file.filename.lower().endswith('.zip'):
+                add(file.filename, file.stream)
+                continue
             try:
-                if not para.text.strip():
-                    # Add space for empty paragraphs
-                    elements.append(Spacer(1, 0.1*inch))
-                else:
-                    # Detect paragraph style/formatting
-                    text = para.text.strip()
-                    
-                    # Get paragraph style level to determine formatting
-                    style_name = para.style.name if para.style else 'Normal'
-                    
-                    # Create styled paragraph
-                    if 'Heading 1' in style_name or 'Title' in style_name:
-                        para_obj = Paragraph(f"<b><font size=14>{text}</font></b>", title_style)
-                    elif 'Heading 2' in style_name or 'Heading' in style_name:
-                        para_obj = Paragraph(f"<b><font size=12>{text}</font></b>", heading_style)
-                    else:
-                        # Apply formatting from the paragraph
-                        formatted_text = text
-                        if para.runs:
-                            formatted_parts = []
-                            for run in para.runs:
-                                run_text = run.text
-                                if run.bold:
-                                    run_text = f"<b>{run_text}</b>"
-                                if run.italic:
-                                    run_text = f"<i>{run_text}</i>"
-                                if run.underline:
-                                    run_text = f"<u>{run_text}</u>"
-                                formatted_parts.append(run_text)
-                            formatted_text = ''.join(formatted_parts)
-                        
-                        para_obj = Paragraph(formatted_text, body_style)
-                    
-                    elements.append(para_obj)
-                    elements.append(Spacer(1, 0.05*inch))
-            
-            except Exception as e:
-                print(f"Error processing paragraph: {e}")
+                with zipfile.ZipFile(file.stream) as archive:
+                    # Refuse an archive that would expand past the limits before inflating any of it
+                    try:
+                        check_zip_entries(archive.infolist(), *upload_limits())
+                    except RejectedUpload as e:
+                        items.append((file.filename, None, str(e)))
+                        continue
+                    for info in archive.infolist():
+                        if not info.is_dir():
+                            with archive.open(info) as entry:
+                                add(os.path.basename(info.filename), entry)
+            except zipfile.BadZipFile:
+                items.append((file.filename, None, 'Not a valid ZIP archive'))
+    except Exception:
+        remove_batch_uploads(items)
+        raise
+    return items
+
+def remove_batch_uploads(items):
+    """Delete the spool files of read_batch_uploads() items that are still there"""
+    for _, spooled, _ in items:
+        if spooled is not None:
+            remove_file(spooled[0])
+
+def convert_batch(items, options=None, upload_seconds=0.0):
+    """Convert read_batch_uploads() items in parallel and yield results as they finish.
+
+    upload_seconds, the time spent receiving and spooling the request, is
+    recorded as each file's upload_read in proportion to its size.
+
+    Yields (index, filename, pdf_path, error) tuples; a failed file has
+    pdf_path set to None and never stops the rest of the batch. Each PDF is
+    a spool file the caller removes, and each upload is removed once it is
+    converted. If the caller stops early, uploads not yet dispatched are
+    removed by the feeding thread, and PDFs of results the caller never
+    takes are removed once that thread has stopped.
+    """
+    results = queue.Queue()
+    stopped = threading.Event()
+    pool = get_conversion_pool()
+    cache = get_result_cache()
+    total_size = sum(spooled[1] for _, spooled, _ in items if spooled is not None)
+
+    def finished(index, filename, upload_path, key, size, output_path, future):
+        remove_file(upload_path)
+        if future.exception() is not None:
+            remove_file(output_path)
+            results.put((index, filename, None, str(future.exception())))
+        else:
+            upload_read = upload_seconds * size / total_size if total_size else 0.0
+            record_stage_metrics(get_file_type(filename), size, dict(future.result()['timings'], upload_read=upload_read))
+            cache.put_file(key, output_path)
+            results.put((index, filename, output_path, None))
+
+    def feed():
+        for index, (filename, spooled, error) in enumerate(items):
+            if error:
+                results.put((index, filename, None, error))
                 continue
-        
-        # Process tables
-        for table in doc.tables:
+
+            upload_path, size, key = spooled
+            if stopped.is_set():
+                remove_file(upload_path)
+                results.put((index, filename, None, 'Batch cancelled'))
+                continue
+            file_type = get_file_type(filename)
             try:
-                # Extract table data
-                table_data = []
-                for row in table.rows:
-                    row_data = []
-                    for cell in row.cells:
-                        cell_text = cell.text.strip()
-                        row_data.append(cell_text)
-                    table_data.append(row_data)
-                
-                if table_data:
-                    # Create table
-                    pdf_table = Table(table_data)
-                    
-                    # Style the table
-                    pdf_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 9),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#D9E2F3')),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#A6B4D0')),
-                        ('FONTSIZE', (0, 1), (-1, -1), 8),
-                        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#E7EEF7')]),
-                    ]))
-                    
-                    elements.append(pdf_table)
-                    elements.append(Spacer(1, 0.2*inch))
-            
-            except Exception as e:
-                print(f"Error processing table: {e}")
+                with open(upload_path, 'rb') as upload:
+                    sniff_upload(upload, file_type, *upload_limits())
+            except RejectedUpload as e:
+                remove_file(upload_path)
+                results.put((index, filename, None, str(e)))
+                continue
+            output_path = new_spool_path('.pdf')
+            cached = cache.open(key)
+            if cached is not None:
+                remove_file(upload_path)
+                with cached, open(output_path, 'wb') as output:
+                    shutil.copyfileobj(cached, output, SPOOL_CHUNK_SIZE)
+                results.put((index, filename, output_path, None))
                 continue
-        
-        # Build PDF
-        if not elements:
-            elements.append(Paragraph("No content found in the document.", styles['Normal']))
-        
-        pdf_doc.build(elements)
-        pdf_buffer.seek(0)
-        
-        return pdf_buffer
-    
-    except Exception as e:
-        print(f"Fatal error in docx_to_pdf: {e}")
-        raise
 
-def txt_to_pdf(txt_file):
-    """Convert text file to PDF"""
-    try:
-        # Read the text file
-        content = txt_file.read().decode('utf-8', errors='replace')
-        
-        # Create PDF in memory
-        pdf_buffer = io.BytesIO()
-        pdf_doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, leftMargin=0.75*inch, rightMargin=0.75*inch, topMargin=0.75*inch, bottomMargin=0.75*inch)
-        
-        elements = []
-        styles = getSampleStyleSheet()
-        body_style = styles['Normal']
-        
-        # Split content into lines and process
-        lines = content.split('\n')
-        
-        for line in lines:
             try:
-                line = line.rstrip()
-                
-                if not line.strip():
-                    # Add space for empty lines
-                    elements.append(Spacer(1, 0.1*inch))
-                else:
-                    # Escape special characters for PDF
-                    safe_line = line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                    para = Paragraph(safe_line, body_style)
-                    elements.append(para)
-                    elements.append(Spacer(1, 0.05*inch))
-            
+                # Wait for a free slot so a large batch queues behind itself instead of failing
+                future = pool.dispatch(convert_path, file_type, upload_path, output_path, False, None, options, block=True)
             except Exception as e:
-                print(f"Error processing line: {e}")
+                remove_file(upload_path)
+                remove_file(output_path)
+                results.put((index, filename, None, str(e)))
                 continue
-        
-        # Build PDF
-        if not elements:
-            elements.append(Paragraph("No content found in the text file.", styles['Normal']))
-        
-        pdf_doc.build(elements)
-        pdf_buffer.seek(0)
-        
-        return pdf_buffer
+            future.add_done_callback(
+                functools.partial(finished, index, filename, upload_path, key, size, output_path))
+
+    def discard(count):
+        # Every upload is removed once the feeding thread and the conversions it dispatched are done
+        feeder.join()
+        for _ in range(count):
+            pdf_path = results.get()[2]
+            if pdf_path is not None:
+                remove_file(pdf_path)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    delivered = 0
+    try:
+        for _ in items:
+            result = results.get()
+            delivered += 1
+            yield result
+    finally:
+        if delivered < len(items):
+            # The client went away; stop dispatching and clean up after the conversions still running
+            stopped.set()
+            threading.Thread(target=discard, args=(len(items) - delivered,), daemon=True).start()
+
+def batch_manifest_entry(filename, error, output=None):
+    """Describe the outcome of one batch file"""
+    if error:
+        print(f"Batch conversion error for {filename}: {error}")
+        return {'file': filename, 'status': 'failed', 'error': error}
+    entry = {'file': filename, 'status': 'converted'}
+    if output:
+        entry['output'] = output
+    return entry
+
+def batch_manifest_header(manifest):
+    """Return the X-Batch-Manifest value: the manifest as JSON, or only its counts if that is over BATCH_MANIFEST_HEADER_BYTES"""
+    value = json.dumps(manifest)
+    if len(value) <= BATCH_MANIFEST_HEADER_BYTES:
+        return value
+    failed = sum(entry['status'] == 'failed' for entry in manifest)
+    return json.dumps({'converted': len(manifest) - failed, 'failed': failed, 'truncated': True})
+
+class ZipStreamWriter(io.RawIOBase):
+    """Write-only stream that hands ZipFile output back in chunks"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def validate_upload():
+    """Return (file, None) for a valid upload or (None, error response)"""
+    # Check if file was uploaded
+    if 'file' not in request.files:
+        return None, (jsonify({'error': 'No file uploaded'}), 400)
     
-    except Exception as e:
-        print(f"Fatal error in txt_to_pdf: {e}")
-        raise
+    file = request.files['file']
+    
+    if file.filename == '':
+        return None, (jsonify({'error': 'No file selected'}), 400)
+    
+    if not allowed_file(file.filename):
+        return None, (jsonify({'error': 'Invalid file type. Please upload an Excel or PowerPoint file (.xlsx, .xls, .xlsm, .pptx, .ppt)'}), 400)
+    
+    # Check the real format before the upload is spooled or reaches a worker
+    try:
+        sniff_upload(file.stream, get_file_type(file.filename), *upload_limits())
+    except RejectedUpload as e:
+        return None, (jsonify({'error': str(e)}), e.status)
+    
+    return file, None
+
+def upload_limits():
+    """Return the (uncompressed bytes, entries, compression ratio) limits for ZIP uploads"""
+    return app.config['MAX_UNCOMPRESSED_BYTES'], app.config['MAX_ZIP_ENTRIES'], app.config['MAX_COMPRESSION_RATIO']
+
+def pdf_filename_for(filename):
+    """Generate the output filename for an uploaded file"""
+    original_filename = secure_filename(filename)
+    return os.path.splitext(original_filename)[0] + '.pdf'
 
 @app.route('/')
 def index():
@@ -446,49 +770,346 @@ def index():
 
 @app.route('/convert', methods=['POST'])
 def convert():
+    # Reading request.files receives and parses the whole multipart body, so upload_read starts here
+    upload_start = time.perf_counter()
+    upload_path = None
     try:
-        # Check if file was uploaded
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file uploaded'}), 400
+        file, error = validate_upload()
+        if error:
+            return error
         
-        file = request.files['file']
+        file_type = get_file_type(file.filename)
+        profile = request.args.get('profile') == '1'
+        options, parallel, error = conversion_options(file_type, profile)
+        if error:
+            return error
+        thumbnails = request.args.get('output') == 'thumbnails'
         
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+        # Copy the upload to the spool directory in chunks, hashing it on the way
+        upload_path, size, key = spool_upload(file, file_type, *options_key_parts(options, parallel))
+        timings = {'upload_read': time.perf_counter() - upload_start}
+        thumbnails_key = cache_hasher(key, 'thumbnails', app.config['THUMBNAIL_WIDTH']).hexdigest() if thumbnails else None
         
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type. Please upload an Excel or PowerPoint file (.xlsx, .xls, .xlsm, .pptx, .ppt)'}), 400
+        # Serve repeated uploads from the cache, otherwise convert on the shared worker pool.
+        # Profiled requests always convert, since a cache hit has nothing to profile.
+        result_file = None if profile else get_result_cache().open(thumbnails_key or key)
+        cache_status = 'HIT'
+        conversion_seconds = None
+        if result_file is None:
+            # Profiled requests never render thumbnails, so they convert even when the PDF is cached
+            pdf_file = get_result_cache().open(key) if thumbnails and not profile else None
+            if pdf_file is None:
+                output_path = new_spool_path('.pdf')
+                conversion_start = time.perf_counter()
+                try:
+                    if parallel:
+                        result = convert_path_parallel(file_type, upload_path, output_path, options)
+                    else:
+                        result = get_conversion_pool().run(
+                            convert_path, file_type, upload_path, output_path, profile, None, options)
+                    timings.update(result['timings'])
+                    conversion_seconds = time.perf_counter() - conversion_start
+                    get_result_cache().put_file(key, output_path)
+                    if not profile:
+                        # The open file stays readable after its path is removed below
+                        pdf_file = open(output_path, 'rb')
+                finally:
+                    remove_file(output_path)
+            if thumbnails and not profile:
+                thumbnails_start = time.perf_counter()
+                pdf_file = thumbnails_zip(pdf_file, thumbnails_key)
+                timings['thumbnails'] = time.perf_counter() - thumbnails_start
+            result_file = pdf_file
+            cache_status = 'MISS'
+        record_stage_metrics(file_type, size, timings)
         
-        # Determine file type and convert accordingly
-        file_type = get_file_type(file.filename)
+        if profile:
+            return jsonify({'file_type': file_type, 'size': size, 'timings': timings, 'profile': result['profile']}), 200
         
-        if file_type == 'excel':
-            pdf_buffer = excel_to_pdf(file)
-        elif file_type == 'powerpoint':
-            pdf_buffer = pptx_to_pdf(file)
-        elif file_type == 'word':
-            pdf_buffer = docx_to_pdf(file)
-        elif file_type == 'text':
-            pdf_buffer = txt_to_pdf(file)
-        else:
-            return jsonify({'error': 'Unsupported file type'}), 400
+        # The send stage ends when the WSGI server has written the whole body and closes it
+        send_start = time.perf_counter()
+        def record_send():
+            record_stage_metrics(file_type, size, {'send': time.perf_counter() - send_start})
         
-        # Generate output filename
-        original_filename = secure_filename(file.filename)
-        pdf_filename = os.path.splitext(original_filename)[0] + '.pdf'
-        
-        return send_file(
-            pdf_buffer,
-            mimetype='application/pdf',
+        result_size = get_file_size(result_file)
+        download_name = pdf_filename_for(file.filename)
+        if thumbnails:
+            download_name = os.path.splitext(download_name)[0] + '-thumbnails.zip'
+        response = send_file(
+            CallbackFile(result_file, on_close=record_send),
+            mimetype='application/zip' if thumbnails else 'application/pdf',
             as_attachment=True,
-            download_name=pdf_filename
+            download_name=download_name
         )
+        response.content_length = result_size
+        response.headers['X-Cache'] = cache_status
+        if not thumbnails:
+            response.headers['X-PDF-Quality'] = pdf_quality_header(options['quality'], result_size, conversion_seconds)
+        response.headers['Server-Timing'] = server_timing_header(timings)
+        return response
+    
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429
+    
+    except PageRangeError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    except RequestEntityTooLarge:
+        # Answered with JSON by upload_too_large()
+        raise
     
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
         print(f"Conversion error: {error_trace}")
         return jsonify({'error': f'Conversion failed: {str(e)}'}), 500
+    
+    finally:
+        if upload_path:
+            remove_file(upload_path)
+
+@app.route('/preview', methods=['POST'])
+def preview():
+    upload_path = None
+    try:
+        file, error = validate_upload()
+        if error:
+            return error
+        
+        file_type = get_file_type(file.filename)
+        options, _, error = conversion_options(file_type)
+        if error:
+            return error
+        width = app.config['PREVIEW_WIDTH']
+        upload_path, size, key = spool_upload(file, file_type, *options_key_parts(options, False), 'preview', width)
+        
+        result_file = get_result_cache().open(key)
+        cache_status = 'HIT'
+        timings = {}
+        if result_file is None:
+            png_path = new_spool_path('.png')
+            try:
+                result = get_conversion_pool().run(render_preview, file_type, upload_path, png_path, width, options)
+                timings = result['timings']
+                get_result_cache().put_file(key, png_path)
+                result_file = open(png_path, 'rb')
+            finally:
+                remove_file(png_path)
+            cache_status = 'MISS'
+            record_stage_metrics(file_type, size, timings)
+        
+        response = send_file(
+            result_file,
+            mimetype='image/png',
+            download_name=os.path.splitext(pdf_filename_for(file.filename))[0] + '-preview.png'
+        )
+        response.headers['X-Cache'] = cache_status
+        response.headers['Server-Timing'] = server_timing_header(timings)
+        return response
+    
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429
+    
+    except PageRangeError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    except RequestEntityTooLarge:
+        # Answered with JSON by upload_too_large()
+        raise
+    
+    except Exception as e:
+        import traceback
+        error_trace = traceback.format_exc()
+        print(f"Preview error: {error_trace}")
+        return jsonify({'error': f'Preview failed: {str(e)}'}), 500
+    
+    finally:
+        if upload_path:
+            remove_file(upload_path)
+
+@app.route('/convert/batch', methods=['POST'])
+def convert_batch_route():
+    upload_start = time.perf_counter()
+    output = request.args.get('output', 'pdf')
+    if output not in ('pdf', 'zip'):
+        return jsonify({'error': 'output must be "pdf" or "zip"'}), 400
+    theme, error = theme_option()
+    if error:
+        return error
+    options = {'theme': theme}
+    
+    try:
+        items = read_batch_uploads(request.files.getlist('files'), *options_key_parts(options, False))
+    except RejectedUpload as e:
+        return jsonify({'error': str(e)}), e.status
+    if not items:
+        return jsonify({'error': 'No files uploaded'}), 400
+    upload_seconds = time.perf_counter() - upload_start
+    
+    if output == 'zip':
+        def generate():
+            # PDFs are already compressed, so entries are stored as-is
+            writer = ZipStreamWriter()
+            manifest = [None] * len(items)
+            used_names = set()
+            batch = convert_batch(items, options, upload_seconds)
+            try:
+                with zipfile.ZipFile(writer, 'w', zipfile.ZIP_STORED) as archive:
+                    for index, filename, pdf_path, error in batch:
+                        output_name = None
+                        if pdf_path is not None:
+                            output_name = pdf_filename_for(filename)
+                            base, counter = os.path.splitext(output_name)[0], 2
+                            while output_name in used_names:
+                                output_name = f'{base}-{counter}.pdf'
+                                counter += 1
+                            used_names.add(output_name)
+                            try:
+                                with open(pdf_path, 'rb') as pdf, archive.open(output_name, 'w') as entry:
+                                    for chunk in iter(lambda: pdf.read(SPOOL_CHUNK_SIZE), b''):
+                                        entry.write(chunk)
+                                        yield writer.drain()
+                            finally:
+                                remove_file(pdf_path)
+                        manifest[index] = batch_manifest_entry(filename, error, output_name)
+                        yield writer.drain()
+                    archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+                yield writer.drain()
+            finally:
+                # Closing the batch now, not when it is garbage collected, stops it feeding and removes its uploads
+                batch.close()
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=converted.zip'}
+        )
+    
+    # A merged PDF needs every part, in upload order, before it can be written
+    parts = [None] * len(items)
+    manifest = [None] * len(items)
+    batch = convert_batch(items, options, upload_seconds)
+    try:
+        for index, filename, pdf_path, error in batch:
+            parts[index] = pdf_path
+            manifest[index] = batch_manifest_entry(filename, error)
+        
+        merged = [(filename, pdf_path) for (filename, _, _), pdf_path in zip(items, parts) if pdf_path is not None]
+        if not merged:
+            return jsonify({'error': 'No files could be converted', 'files': manifest}), 422
+        
+        output_path = new_spool_path('.pdf')
+        try:
+            with open(output_path, 'wb') as merged_file:
+                merge_pdfs(merged, merged_file)
+            # The open file stays readable after its path is removed below
+            merged_file = open(output_path, 'rb')
+        finally:
+            remove_file(output_path)
+    finally:
+        batch.close()
+        for pdf_path in parts:
+            if pdf_path is not None:
+                remove_file(pdf_path)
+    
+    response = send_file(
+        merged_file,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name='converted.pdf'
+    )
+    response.headers['X-Batch-Manifest'] = batch_manifest_header(manifest)
+    return response
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    upload_start = time.perf_counter()
+    file, error = validate_upload()
+    if error:
+        return error
+    
+    file_type = get_file_type(file.filename)
+    options, parallel, error = conversion_options(file_type)
+    if error:
+        return error
+    upload_path, size, key = spool_upload(file, file_type, *options_key_parts(options, parallel))
+    upload_seconds = time.perf_counter() - upload_start
+    # The result lives in the spool directory until the job expires
+    output_path = new_spool_path('.pdf')
+    cleanup = functools.partial(remove_file, output_path)
+    
+    cached = get_result_cache().open(key)
+    if cached is not None:
+        remove_file(upload_path)
+        with cached, open(output_path, 'wb') as output:
+            shutil.copyfileobj(cached, output, SPOOL_CHUNK_SIZE)
+        result = {'pdf_path': output_path, 'timings': {}, 'profile': None}
+        job = get_conversion_pool().add_result(result, filename=file.filename, cleanup=cleanup)
+        return jsonify(job.to_dict()), 202, {'Location': f'/jobs/{job.id}'}
+    
+    try:
+        if parallel:
+            job = get_conversion_pool().submit_thread(convert_path_parallel, file_type, upload_path, output_path, options,
+                                                      True, filename=file.filename, cleanup=cleanup)
+        else:
+            job = get_conversion_pool().submit(convert_path, file_type, upload_path, output_path, False, None, options,
+                                               filename=file.filename, cleanup=cleanup)
+    except QueueFullError as e:
+        remove_file(upload_path)
+        remove_file(output_path)
+        return jsonify({'error': str(e)}), 429
+    
+    def cache_result(future):
+        remove_file(upload_path)
+        if future.exception() is None:
+            record_stage_metrics(file_type, size, dict(future.result()['timings'], upload_read=upload_seconds))
+            get_result_cache().put_file(key, output_path)
+    job.future.add_done_callback(cache_result)
+    
+    return jsonify(job.to_dict()), 202, {'Location': f'/jobs/{job.id}'}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_conversion_pool().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = get_conversion_pool().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    status = job.status
+    if status == 'failed':
+        return jsonify({'error': f'Conversion failed: {job.error}', 'status': status}), 500
+    if status != 'finished':
+        return jsonify({'error': 'Job is not finished yet', 'status': status}), 409
+    
+    try:
+        return send_file(
+            job.future.result()['pdf_path'],
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=pdf_filename_for(job.filename)
+        )
+    except FileNotFoundError:
+        # The job expired while this request was being handled
+        return jsonify({'error': 'Job not found'}), 404
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'File is too large. The maximum upload size is {limit_mb}MB.'}), 413
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(metrics_registry.expose(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(get_result_cache().stats()), 200
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -0,0 +1,214 @@
+"""ASGI entry point that keeps slow clients off the request threads.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+The Flask app stays a WSGI app. This adapter receives each request body on
+the event loop, spooling it to memory or disk as it trickles in, and only
+then runs the Flask view on a thread pool. Responses go back the same way:
+a thread reads the next chunk of the result and the event loop sends it at
+the client's pace. A client on a slow link therefore holds a coroutine and a
+socket, never a thread or a process. The threads only wait on conversions,
+which run in the app's process pool as before.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import sys
+import tempfile
+
+from werkzeug.wsgi import FileWrapper
+
+from app import app, get_spool_dir, warm_up
+
+BODY_MEMORY_BYTES = 64 * 1024  # Request bodies larger than this are spooled to disk while they arrive
+SEND_CHUNK_SIZE = 256 * 1024  # Bytes of a file response read per thread hop
+
+
+class ASGIAdapter:
+    """ASGI application serving a WSGI app with all client I/O done on the event loop.
+
+    max_body_bytes stops receiving a body once it is too large; the WSGI app
+    then sees the oversized CONTENT_LENGTH and answers 413 itself. startup,
+    if given, runs on a worker thread when the server starts.
+    """
+
+    def __init__(self, wsgi_app, threads, max_body_bytes=None, startup=None):
+        self.wsgi_app = wsgi_app
+        self.executor = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix='asgi-view')
+        self.max_body_bytes = max_body_bytes
+        self.startup = startup
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        """Run startup before the server accepts connections, and stop the thread pool on shutdown"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.startup is not None:
+                    await asyncio.get_running_loop().run_in_executor(self.executor, self.startup)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        body, size = await self.receive_body(scope, receive)
+        if body is None:
+            # The client went away before sending its whole request
+            return
+
+        loop = asyncio.get_running_loop()
+        # Every step of one request runs in the same context, so Flask's
+        # request context survives streamed responses that hop between threads
+        context = contextvars.copy_context()
+        try:
+            status, headers, chunks, iterable = await loop.run_in_executor(
+                self.executor, context.run, self.start_wsgi_app, wsgi_environ(scope, body, size))
+            try:
+                await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                for chunk in chunks:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                while True:
+                    chunk = await loop.run_in_executor(self.executor, context.run, next, iterable, None)
+                    if chunk is None:
+                        break
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                close = getattr(iterable, 'close', None)
+                if close is not None:
+                    await loop.run_in_executor(self.executor, context.run, close)
+        finally:
+            body.close()
+
+    async def receive_body(self, scope, receive):
+        """Receive a request body into a spooled temporary file and return (file rewound, size).
+
+        Returns (None, 0) if the client disconnects first. A body larger than
+        max_body_bytes is not read any further.
+        """
+        declared = None
+        for name, value in scope['headers']:
+            if name == b'content-length' and value.isdigit():
+                declared = int(value)
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_MEMORY_BYTES, dir=get_spool_dir())
+        if declared is not None and self.max_body_bytes is not None and declared > self.max_body_bytes:
+            return body, declared
+
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None, 0
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if self.max_body_bytes is not None and size > self.max_body_bytes:
+                return body, size
+            body.write(chunk)
+            more_body = message.get('more_body', False)
+        body.seek(0)
+        return body, size
+
+    def start_wsgi_app(self, environ):
+        """Call the WSGI app on a worker thread and return (status, headers, first chunks, rest of the body).
+
+        The rest of the body is an iterator that also has the iterable's close().
+        """
+        response = []
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response[:] = [int(status.split(' ', 1)[0]),
+                           [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]]
+            return written.append
+
+        result = self.wsgi_app(environ, start_response)
+        iterable = ResponseIterator(result)
+        # WSGI apps may delay start_response until their first chunk is produced
+        chunks = written
+        if not response:
+            first = next(iterable, None)
+            if first is not None:
+                chunks = written + [first]
+        return response[0], response[1], chunks, iterable
+
+
+class ResponseIterator:
+    """Iterator over a WSGI response that forwards close() to it"""
+
+    def __init__(self, result):
+        self.result = result
+        self.iterator = iter(result)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.iterator)
+
+    def close(self):
+        close = getattr(self.result, 'close', None)
+        if close is not None:
+            close()
+
+
+def file_wrapper(file, buffer_size=8192):
+    """wsgi.file_wrapper that reads files in SEND_CHUNK_SIZE chunks, so sending one takes few thread hops"""
+    return FileWrapper(file, max(buffer_size, SEND_CHUNK_SIZE))
+
+
+def wsgi_environ(scope, body, size):
+    """Build the WSGI environ for an ASGI HTTP scope whose body has been received into `body`"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        # The body is complete, so its length is known even for chunked uploads
+        'CONTENT_LENGTH': str(size),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': file_wrapper,
+    }
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = client[0], str(client[1])
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key in ('CONTENT_LENGTH', 'TRANSFER_ENCODING'):
+            continue
+        if key != 'CONTENT_TYPE':
+            key = 'HTTP_' + key
+        value = value.decode('latin-1')
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+application = ASGIAdapter(
+    app,
+    app.config['ASGI_THREADS'],
+    max_body_bytes=app.config['MAX_CONTENT_LENGTH'],
+    startup=warm_up,
+)
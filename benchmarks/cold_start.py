@@ -0,0 +1,90 @@
+"""Measure app import time and first-request latency in fresh interpreters.
+
+Usage:
+    python benchmarks/cold_start.py --repeat 5
+    python benchmarks/cold_start.py --warm    # call app.warm_up() before the first request
+
+Conversions run inline (CONVERSION_WORKERS=0) with the result and fragment
+disk caches disabled, which is how a serverless cold start serves its first
+request.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+
+# Small inputs so library loading, not conversion work, dominates the first request
+INPUTS = {
+    'excel': lambda: corpus.make_excel(200, 8),
+    'powerpoint': lambda: corpus.make_pptx(3, image_px=(400, 300)),
+    'word': lambda: corpus.make_docx(50, tables=1),
+    'text': lambda: corpus.make_text(4 * 1024),
+}
+
+
+def run_child(file_type, path, warm):
+    """Import the app, then time /health and one /convert request"""
+    sys.path.insert(0, ROOT)
+    start = time.perf_counter()
+    import app
+    result = {'import_seconds': time.perf_counter() - start}
+
+    if warm:
+        start = time.perf_counter()
+        app.warm_up()
+        result['warm_up_seconds'] = time.perf_counter() - start
+
+    client = app.app.test_client()
+    start = time.perf_counter()
+    response = client.get('/health')
+    result['health_seconds'] = time.perf_counter() - start
+    assert response.status_code == 200
+
+    with open(path, 'rb') as f:
+        start = time.perf_counter()
+        response = client.post('/convert', data={'file': (f, os.path.basename(path))})
+        result['first_convert_seconds'] = time.perf_counter() - start
+    assert response.status_code == 200, response.get_data(as_text=True)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='fresh interpreters per file type; medians are reported')
+    parser.add_argument('--warm', action='store_true', help='call app.warm_up() before the first request')
+    parser.add_argument('--child', nargs=2, metavar=('FILE_TYPE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child, args.warm)
+        return
+
+    env = dict(os.environ, CONVERSION_WORKERS='0', CACHE_DISK_BYTES='0', FRAGMENT_CACHE_DISK_BYTES='0')
+    print(f"{'file type':>11} {'import s':>9} {'warm-up s':>10} {'health s':>9} {'convert s':>10}")
+    for file_type, make_input in INPUTS.items():
+        path = make_input()
+        runs = []
+        for _ in range(args.repeat):
+            command = [sys.executable, os.path.abspath(__file__), '--child', file_type, path]
+            if args.warm:
+                command.append('--warm')
+            output = subprocess.run(command, check=True, capture_output=True, text=True, env=env).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+        def median(key):
+            return statistics.median(run.get(key, 0.0) for run in runs)
+
+        print(f"{file_type:>11} {median('import_seconds'):>9.3f} {median('warm_up_seconds'):>10.3f} "
+              f"{median('health_seconds'):>9.3f} {median('first_convert_seconds'):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Synthetic input generators for the converter benchmarks.
+
+Every generator is deterministic for a given set of parameters and caches
+its output under CORPUS_DIR, so repeated runs measure identical inputs.
+"""
+import io
+import os
+import random
+import tempfile
+
+CORPUS_DIR = os.environ.get('BENCH_CORPUS_DIR', os.path.join(tempfile.gettempdir(), 'pdfconverter-bench-corpus'))
+
+WORDS = ('revenue', 'forecast', 'quarter', 'customer', 'region', 'growth', 'margin', 'total',
+         'request', 'cache', 'timeout', 'query', 'update', 'report', 'north', 'south')
+LOG_LEVELS = ('DEBUG', 'INFO', 'INFO', 'INFO', 'WARN', 'ERROR')
+
+
+def _cached(name, write):
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    path = os.path.join(CORPUS_DIR, name)
+    if not os.path.exists(path):
+        tmp_path = path + '.tmp'
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _sentence(rng, low=4, high=14):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + '.'
+
+
+def make_excel(rows, cols, sheets=1, seed=0, empty_cols=0, long_text=False):
+    """Workbook with `sheets` sheets of a header row plus rows x cols mixed cells.
+
+    `empty_cols` formatted but empty columns follow the data, as left behind by
+    clearing cells in Excel. With `long_text` the last column holds sentences
+    long enough to need wrapping.
+    """
+    def write(path):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        rng = random.Random(seed)
+        wb = Workbook(write_only=True)
+        for s in range(sheets):
+            ws = wb.create_sheet(f'Sheet {s + 1}')
+            ws.append([f'Column {c + 1}' for c in range(cols)])
+            for r in range(rows):
+                row = [round(rng.uniform(0, 10000), 2) if c % 2 else rng.choice(WORDS) for c in range(cols)]
+                if long_text:
+                    row[-1] = ' '.join(_sentence(rng) for _ in range(rng.randint(1, 6)))
+                ws.append(row)
+            if empty_cols:
+                styled = WriteOnlyCell(ws)
+                styled.font = Font(bold=True)
+                ws.append([None] * (cols + empty_cols - 1) + [styled])
+        wb.save(path)
+
+    suffix = (f'_e{empty_cols}' if empty_cols else '') + ('_long' if long_text else '')
+    return _cached(f'excel_{rows}x{cols}x{sheets}_{seed}{suffix}.xlsx', write)
+
+
+def make_pptx(slides, images_per_slide=1, image_px=(1600, 1000), seed=0):
+    """Deck of `slides` slides with a title, body text and noise images plus a shared logo"""
+    def write(path):
+        from PIL import Image
+        from pptx import Presentation
+        from pptx.util import Inches
+
+        rng = random.Random(seed)
+        prs = Presentation()
+        logo = io.BytesIO()
+        Image.new('RGBA', (600, 200), (200, 40, 40, 160)).save(logo, 'PNG')
+
+        for i in range(slides):
+            slide = prs.slides.add_slide(prs.slide_layouts[1])
+            slide.shapes.title.text = f'Slide {i + 1}: {_sentence(rng, 2, 5)}'
+            slide.placeholders[1].text = '\n'.join(_sentence(rng) for _ in range(3))
+            for j in range(images_per_slide):
+                picture = io.BytesIO()
+                Image.effect_noise(image_px, 30 + (i + j) % 50).convert('RGB').save(picture, 'JPEG', quality=90)
+                picture.seek(0)
+                slide.shapes.add_picture(picture, Inches(1 + j), Inches(4), Inches(3))
+            logo.seek(0)
+            slide.shapes.add_picture(logo, Inches(0.2), Inches(0.2), Inches(1))
+        prs.save(path)
+
+    return _cached(f'pptx_{slides}x{images_per_slide}_{image_px[0]}x{image_px[1]}_{seed}.pptx', write)
+
+
+def make_docx(paragraphs, tables=0, table_rows=10, seed=0):
+    """Document with headings every 20 paragraphs, formatted runs and tables spread through it"""
+    def write(path):
+        from docx import Document
+
+        rng = random.Random(seed)
+        doc = Document()
+        table_every = paragraphs // tables if tables else None
+        for i in range(paragraphs):
+            if i % 20 == 0:
+                doc.add_heading(_sentence(rng, 2, 6), level=1 if i % 100 == 0 else 2)
+            para = doc.add_paragraph(_sentence(rng) + ' ')
+            run = para.add_run(_sentence(rng, 2, 5))
+            run.bold = i % 3 == 0
+            run.italic = i % 5 == 0
+            if table_every and i % table_every == table_every - 1:
+                table = doc.add_table(rows=table_rows, cols=4)
+                for r, row in enumerate(table.rows):
+                    for c, cell in enumerate(row.cells):
+                        cell.text = f'Header {c + 1}' if r == 0 else rng.choice(WORDS)
+        doc.save(path)
+
+    return _cached(f'docx_{paragraphs}x{tables}x{table_rows}_{seed}.docx', write)
+
+
+def make_text(size_bytes, seed=0):
+    """Log-style text file of roughly size_bytes with occasional blank lines"""
+    def write(path):
+        rng = random.Random(seed)
+        total = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            while total < size_bytes:
+                if rng.random() < 0.02:
+                    line = ''
+                else:
+                    words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 30)))
+                    line = (f'2024-05-{rng.randint(1, 28):02d} 12:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} '
+                            f'{rng.choice(LOG_LEVELS)} {words}')
+                f.write(line + '\n')
+                total += len(line) + 1
+
+    return _cached(f'text_{size_bytes}_{seed}.txt', write)
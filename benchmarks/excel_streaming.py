@@ -0,0 +1,71 @@
+"""Compare peak RSS and wall time of the two Excel conversion paths.
+
+Usage:
+    python benchmarks/excel_streaming.py --rows 1000 10000 100000 --cols 12
+
+Each conversion runs in a fresh interpreter so peak RSS is not polluted by
+earlier runs. Workbooks come from benchmarks/corpus.py and are cached.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+
+MODES = ('table', 'streaming')
+
+
+def run_child(mode, path):
+    """Convert one workbook in this process and print a JSON result line"""
+    sys.path.insert(0, ROOT)
+    from converters import get_converter
+
+    converter = get_converter('excel', 'streaming' if mode == 'streaming' else 'table')
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        pdf_buffer = converter(f)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'seconds': elapsed,
+        'peak_rss_mb': rss_after / 1024,
+        'conversion_rss_mb': (rss_after - rss_before) / 1024,
+        'pdf_bytes': len(pdf_buffer.getvalue()),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--cols', type=int, default=12)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    print(f"{'rows':>8} {'mode':>10} {'seconds':>9} {'peak MB':>9} {'conv MB':>9} {'pdf KB':>9}")
+    for rows in args.rows:
+        path = corpus.make_excel(rows, args.cols)
+        for mode in args.modes:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', mode, path],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{rows:>8} {mode:>10} {result['seconds']:>9.2f} {result['peak_rss_mb']:>9.1f} "
+                  f"{result['conversion_rss_mb']:>9.1f} {result['pdf_bytes'] / 1024:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
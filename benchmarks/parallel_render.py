@@ -0,0 +1,71 @@
+"""Compare serial and parallel rendering of large workbooks and decks across worker counts.
+
+Usage:
+    python benchmarks/parallel_render.py --workers 1 2 4 8 16
+
+Each worker count runs in a fresh interpreter with a started pool and the
+caches disabled. Workbooks render as one document (INCREMENTAL_EXCEL=0),
+so no run reuses sheets cached by an earlier one. Times are for one
+/convert request, serial first and then with ?parallel=1.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+
+INPUTS = {
+    'excel': lambda: corpus.make_excel(3000, 10, sheets=16),
+    'powerpoint': lambda: corpus.make_pptx(200, images_per_slide=1),
+}
+
+
+def run_child(file_type, path):
+    """Start the pool, then time one serial and one parallel /convert request"""
+    sys.path.insert(0, ROOT)
+    import app
+    app.warm_up()
+    client = app.app.test_client()
+
+    result = {}
+    for mode in ('serial', 'parallel'):
+        with open(path, 'rb') as f:
+            start = time.perf_counter()
+            response = client.post(f'/convert?parallel={int(mode == "parallel")}',
+                                   data={'file': (f, os.path.basename(path))})
+            result[mode] = time.perf_counter() - start
+        assert response.status_code == 200, response.get_data(as_text=True)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--child', nargs=2, metavar=('FILE_TYPE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    print(f"{'file type':>11} {'workers':>8} {'serial s':>9} {'parallel s':>11} {'speedup':>8}")
+    for file_type, make_input in INPUTS.items():
+        path = make_input()
+        for workers in args.workers:
+            env = dict(os.environ, CONVERSION_WORKERS=str(workers), CACHE_MEMORY_BYTES='0', CACHE_DISK_BYTES='0',
+                       INCREMENTAL_EXCEL='0')
+            command = [sys.executable, os.path.abspath(__file__), '--child', file_type, path]
+            output = subprocess.run(command, check=True, capture_output=True, text=True, env=env).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{file_type:>11} {workers:>8} {result['serial']:>9.2f} {result['parallel']:>11.2f} "
+                  f"{result['serial'] / result['parallel']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
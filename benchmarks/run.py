@@ -0,0 +1,160 @@
+"""Benchmark all converters on a synthetic corpus and compare against a baseline.
+
+Usage:
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json --threshold 0.15
+
+Each case runs in a fresh interpreter so peak RSS is measured per converter.
+Inputs come from benchmarks/corpus.py and are cached between runs. With
+--compare the exit status is 1 when any case got slower, used more memory or
+produced a larger PDF by more than the threshold.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+
+# (converter function, corpus generator, generator arguments)
+SUITES = {
+    'quick': [
+        ('excel_to_pdf', 'make_excel', {'rows': 2000, 'cols': 10, 'sheets': 2}),
+        ('excel_to_pdf', 'make_excel', {'rows': 2000, 'cols': 6, 'empty_cols': 400}),
+        ('excel_to_pdf', 'make_excel', {'rows': 300, 'cols': 6, 'long_text': True}),
+        ('excel_to_pdf_streaming', 'make_excel', {'rows': 20000, 'cols': 10, 'sheets': 1}),
+        ('pptx_to_pdf', 'make_pptx', {'slides': 20, 'images_per_slide': 1}),
+        ('pptx_to_pdf_faithful', 'make_pptx', {'slides': 20, 'images_per_slide': 1}),
+        ('docx_to_pdf', 'make_docx', {'paragraphs': 500, 'tables': 5}),
+        ('txt_to_pdf', 'make_text', {'size_bytes': 256 * 1024}),
+        ('txt_to_pdf_fast', 'make_text', {'size_bytes': 4 * 1024 * 1024}),
+    ],
+    'full': [
+        ('excel_to_pdf', 'make_excel', {'rows': 10000, 'cols': 12, 'sheets': 4}),
+        ('excel_to_pdf', 'make_excel', {'rows': 10000, 'cols': 8, 'empty_cols': 2000}),
+        ('excel_to_pdf_streaming', 'make_excel', {'rows': 100000, 'cols': 12, 'sheets': 2}),
+        ('pptx_to_pdf', 'make_pptx', {'slides': 100, 'images_per_slide': 2}),
+        ('pptx_to_pdf_faithful', 'make_pptx', {'slides': 100, 'images_per_slide': 2}),
+        ('docx_to_pdf', 'make_docx', {'paragraphs': 5000, 'tables': 50}),
+        ('txt_to_pdf', 'make_text', {'size_bytes': 2 * 1024 * 1024}),
+        ('txt_to_pdf_fast', 'make_text', {'size_bytes': 50 * 1024 * 1024}),
+    ],
+}
+METRICS = ('seconds', 'peak_rss_mb', 'pdf_bytes')
+
+
+def case_id(converter, generator, params):
+    args = ','.join(f'{k}={v}' for k, v in sorted(params.items()))
+    return f'{converter}[{generator.replace("make_", "")}:{args}]'
+
+
+def run_child(converter_name, generator, params, repeat):
+    """Run one case in this process and print its result as JSON"""
+    path = getattr(corpus, generator)(**params)
+    sys.path.insert(0, ROOT)
+    from converters import REGISTRY
+
+    module_name = next(module for module, variants in REGISTRY.values() if converter_name in variants.values())
+    converter = getattr(importlib.import_module(module_name), converter_name)
+    times = []
+    pdf_bytes = 0
+    for _ in range(repeat):
+        with open(path, 'rb') as f:
+            start = time.perf_counter()
+            pdf_bytes = len(converter(f).getvalue())
+            times.append(time.perf_counter() - start)
+    print(json.dumps({
+        'seconds': statistics.median(times),
+        'min_seconds': min(times),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'pdf_bytes': pdf_bytes,
+        'input_bytes': os.path.getsize(path),
+    }))
+
+
+def run_suite(cases, repeat):
+    results = {}
+    for converter, generator, params in cases:
+        # Build the input up front so generation time never lands in a measurement
+        getattr(corpus, generator)(**params)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', converter, generator, json.dumps(params),
+             '--repeat', str(repeat)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        name = case_id(converter, generator, params)
+        results[name] = result
+        print(f"{name:<72} {result['seconds']:>8.2f}s {result['peak_rss_mb']:>8.1f}MB {result['pdf_bytes'] / 1024:>9.0f}KB")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print per-metric changes against a baseline and return the regressed cases"""
+    regressions = []
+    print(f"\n{'case':<72} {'metric':>12} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<72} {'(new case)':>12}")
+            continue
+        for metric in METRICS:
+            old, new = previous[metric], result[metric]
+            change = (new - old) / old if old else 0.0
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions.append((name, metric, change))
+            print(f"{name:<72} {metric:>12} {old:>12.2f} {new:>12.2f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suite', choices=sorted(SUITES), default='quick')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the median time is reported')
+    parser.add_argument('--save', metavar='PATH', help='write results to a JSON baseline file')
+    parser.add_argument('--compare', metavar='PATH', help='compare results against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.15, help='relative increase that counts as a regression')
+    parser.add_argument('--child', nargs=3, metavar=('CONVERTER', 'GENERATOR', 'PARAMS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        converter, generator, params = args.child
+        run_child(converter, generator, json.loads(params), args.repeat)
+        return
+
+    results = run_suite(SUITES[args.suite], args.repeat)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'suite': args.suite,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\nNo regressions above {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
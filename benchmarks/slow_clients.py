@@ -0,0 +1,183 @@
+"""Compare how the sync (gunicorn) and ASGI (uvicorn) setups cope with many slow clients.
+
+Usage:
+    python benchmarks/slow_clients.py --slow 1000 --duration 20
+    python benchmarks/slow_clients.py --servers asgi --slow 5000 --upload-kb 1024
+
+Each server is started on a local port with the disk cache disabled. --slow
+clients then each upload a text file at a trickle, taking about --duration
+seconds, as a large upload over a poor link would. Their start times are
+spread over the first --duration seconds. A probe client meanwhile converts
+a small file back to back. Every upload has the same content, so after the
+first one results come from the cache and the numbers measure connection
+handling, not conversion speed.
+
+Reported per server: the most slow uploads that were open at once, how many
+got a PDF back before the run ended, the p99 time from an upload's last byte
+to its response, and the probe's request count, p50/p99 latency and timeouts.
+Kernel socket buffers absorb much of each trickled upload, so under the sync
+server the slow uploads still finish; the probe's latency shows the request
+threads they hold meanwhile.
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+
+SERVERS = {
+    'sync': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:{port}',
+             '--backlog', '8192', 'app:app'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', '{port}',
+             '--backlog', '8192', '--log-level', 'warning'],
+}
+TRICKLE_INTERVAL = 0.5  # Seconds between the pieces a slow client sends
+PROBE_TIMEOUT = 30  # Seconds before a probe request counts as timed out
+
+
+def multipart_request(path, filename, data):
+    """Return (request head, body) of a multipart POST uploading data as `file`"""
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: text/plain\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    head = (f'POST {path} HTTP/1.1\r\nHost: localhost\r\n'
+            f'Content-Type: multipart/form-data; boundary={boundary}\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n').encode()
+    return head, body
+
+
+async def send_request(port, head, body, duration=0):
+    """Send a request, spreading its body over `duration` seconds, and return (status, seconds from last byte to response)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(head)
+        steps = max(int(duration / TRICKLE_INTERVAL), 1)
+        piece = -(-len(body) // steps)
+        for offset in range(0, len(body), piece):
+            if offset:
+                await asyncio.sleep(TRICKLE_INTERVAL)
+            writer.write(body[offset:offset + piece])
+            await writer.drain()
+        sent = time.perf_counter()
+        response = await reader.read()
+        status = int(response.split(b' ', 2)[1]) if response else 0
+        return status, time.perf_counter() - sent
+    finally:
+        writer.close()
+
+
+async def slow_client(port, head, body, delay, duration, stats):
+    await asyncio.sleep(delay)
+    stats['open'] += 1
+    stats['peak_open'] = max(stats['peak_open'], stats['open'])
+    try:
+        status, seconds = await send_request(port, head, body, duration)
+        if status == 200:
+            stats['completed'].append(seconds)
+        else:
+            stats['failed'] += 1
+    except (OSError, ValueError, IndexError):
+        stats['failed'] += 1
+    finally:
+        stats['open'] -= 1
+
+
+async def probe(port, head, body, until, latencies, stats):
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        try:
+            status, _ = await asyncio.wait_for(send_request(port, head, body), PROBE_TIMEOUT)
+        except (asyncio.TimeoutError, OSError, ValueError, IndexError):
+            stats['probe_timeouts'] += 1
+            continue
+        if status == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            stats['probe_errors'] += 1
+        await asyncio.sleep(0.1)
+
+
+async def load(port, slow, duration, upload, small):
+    stats = {'open': 0, 'peak_open': 0, 'completed': [], 'failed': 0, 'probe_timeouts': 0, 'probe_errors': 0}
+    latencies = []
+    slow_head, slow_body = multipart_request('/convert', 'upload.txt', upload)
+    probe_head, probe_body = multipart_request('/convert', 'probe.txt', small)
+    rng = random.Random(0)
+    clients = [asyncio.create_task(slow_client(port, slow_head, slow_body, rng.uniform(0, duration), duration, stats))
+               for _ in range(slow)]
+    # Slow uploads started last finish around 2 * duration; anything later counts as not completed
+    end = time.perf_counter() + 2 * duration + 10
+    await probe(port, probe_head, probe_body, end, latencies, stats)
+    _, pending = await asyncio.wait(clients, timeout=max(end - time.perf_counter(), 0))
+    for task in pending:
+        task.cancel()
+    return stats, latencies
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[p - 1]
+
+
+def start_server(name, port):
+    env = dict(os.environ, CACHE_DISK_BYTES='0')
+    command = [part.format(port=port) for part in SERVERS[name]]
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1).read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f'{name} server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--slow', type=int, default=1000, help='slow uploading clients')
+    parser.add_argument('--duration', type=float, default=20, help='seconds each slow upload takes')
+    parser.add_argument('--upload-kb', type=int, default=256, help='size of each slow upload')
+    parser.add_argument('--port', type=int, default=5090)
+    args = parser.parse_args()
+
+    # Every slow client needs a socket on each side, and the server a spool file too
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    with open(corpus.make_text(args.upload_kb * 1024), 'rb') as f:
+        upload = f.read()
+    with open(corpus.make_text(4 * 1024, seed=1), 'rb') as f:
+        small = f.read()
+
+    print(f"{'server':>6} {'slow':>6} {'peak open':>10} {'completed':>10} {'failed':>7} {'upload p99 s':>13} "
+          f"{'probes':>7} {'probe p50 s':>12} {'probe p99 s':>12} {'timeouts':>9}")
+    for name in args.servers:
+        server = start_server(name, args.port)
+        try:
+            stats, latencies = asyncio.run(load(args.port, args.slow, args.duration, upload, small))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{name:>6} {args.slow:>6} {stats['peak_open']:>10} {len(stats['completed']):>10} {stats['failed']:>7} "
+              f"{percentile(stats['completed'], 99):>13.3f} {len(latencies):>7} {percentile(latencies, 50):>12.3f} "
+              f"{percentile(latencies, 99):>12.3f} {stats['probe_timeouts']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Compare throughput of the Platypus and direct-canvas text conversion paths.
+
+Usage:
+    python benchmarks/text_fast_path.py --sizes-mb 1 4 50
+
+The Platypus path is skipped above --platypus-max-mb since it takes minutes
+on large inputs.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+from converters.text import txt_to_pdf, txt_to_pdf_fast  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes-mb', type=float, nargs='+', default=[1, 4])
+    parser.add_argument('--platypus-max-mb', type=float, default=8)
+    args = parser.parse_args()
+
+    print(f"{'size MB':>8} {'path':>9} {'seconds':>9} {'MB/s':>8} {'speedup':>8}")
+    for size_mb in args.sizes_mb:
+        with open(corpus.make_text(int(size_mb * 1024 * 1024)), 'rb') as f:
+            data = f.read()
+        timings = {}
+        paths = [('fast', txt_to_pdf_fast)]
+        if size_mb <= args.platypus_max_mb:
+            paths.insert(0, ('platypus', txt_to_pdf))
+        for name, converter in paths:
+            start = time.perf_counter()
+            converter(io.BytesIO(data))
+            timings[name] = time.perf_counter() - start
+            speedup = timings['platypus'] / timings[name] if 'platypus' in timings else float('nan')
+            print(f"{size_mb:>8.1f} {name:>9} {timings[name]:>9.2f} {size_mb / timings[name]:>8.2f} {speedup:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""Content-addressed cache for conversion results with memory and disk tiers"""
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+DISK_SCAN_PUTS = 100  # Disk writes between full scans of the disk tier
+DISK_SCAN_INTERVAL = 60  # Seconds between full scans of the disk tier
+DISK_EVICT_TARGET = 0.9  # Eviction frees the disk tier down to this share of its limit, so writes do not scan every time
+
+
+def cache_hasher(*parts):
+    """Return a SHA-256 object over the converter identity, ready to be fed the upload"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8') + b'\0')
+    return digest
+
+
+def cache_key(data, *parts):
+    """Return a SHA-256 key over the uploaded bytes and the converter identity"""
+    digest = cache_hasher(*parts)
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """Two-tier cache of converted PDFs keyed by cache_key().
+
+    The memory tier is an LRU bounded by total bytes. The disk tier is shared
+    by every process pointing at the same directory: entries are written to a
+    temp file and renamed into place, reads refresh the file's mtime, and the
+    least recently used files are removed once the directory grows past
+    `disk_bytes`. Entries unused for `ttl` seconds expire in both tiers.
+    Each process keeps a running total of the disk tier's size and only scans
+    the directory when that passes `disk_bytes`, or every DISK_SCAN_PUTS
+    writes or DISK_SCAN_INTERVAL seconds to notice other processes' writes.
+    Entries larger than `max_entry_bytes` (a quarter of the memory tier by
+    default) are only kept on disk and are streamed from their file.
+    """
+
+    def __init__(self, memory_bytes, disk_dir=None, disk_bytes=0, ttl=86400, max_entry_bytes=None):
+        self.memory_bytes = memory_bytes
+        self.max_entry_bytes = memory_bytes // 4 if max_entry_bytes is None else max_entry_bytes
+        self.disk_dir = disk_dir if disk_dir and disk_bytes > 0 else None
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None  # Unknown until the first scan
+        self._disk_puts = 0
+        self._disk_scanned = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+        }
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return the cached bytes for key, or None on a miss"""
+        file = self.open(key)
+        if file is None:
+            return None
+        with file:
+            return file.getvalue() if isinstance(file, io.BytesIO) else file.read()
+
+    def open(self, key):
+        """Return a readable binary file with the cached bytes for key, or None on a miss.
+
+        A disk entry stays readable through the returned file even if another
+        process evicts it in the meantime.
+        """
+        now = time.time()
+        with self._lock:
+            value = self._memory_get(key, now)
+            if value is not None:
+                self._stats['memory_hits'] += 1
+                return io.BytesIO(value)
+
+        file = self._disk_open(key, now)
+        with self._lock:
+            if file is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+
+        if os.fstat(file.fileno()).st_size > self.max_entry_bytes:
+            return file
+        with file:
+            value = file.read()
+        with self._lock:
+            self._memory_put(key, value, now)
+        return io.BytesIO(value)
+
+    def put(self, key, value):
+        """Store bytes for key in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._memory_put(key, value, now)
+        if self.disk_dir:
+            self._disk_put(key, lambda f: f.write(value))
+
+    def put_file(self, key, path):
+        """Store the contents of the file at path for key; the caller still owns path"""
+        if os.path.getsize(path) <= self.max_entry_bytes:
+            with open(path, 'rb') as f:
+                value = f.read()
+            now = time.time()
+            with self._lock:
+                self._memory_put(key, value, now)
+        if self.disk_dir:
+            self._disk_put(key, lambda f: _copy_file(path, f), link_from=path)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_size
+        requests = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['memory_hits'] + stats['disk_hits']) / requests if requests else 0.0
+        return stats
+
+    def _memory_get(self, key, now):
+        # Caller holds self._lock
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        value, used = entry
+        if now - used > self.ttl:
+            self._drop_memory(key)
+            return None
+        self._memory[key] = (value, now)
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key, value, now):
+        # Caller holds self._lock
+        if key in self._memory:
+            self._drop_memory(key)
+        if len(value) > self.max_entry_bytes:
+            return
+        self._memory[key] = (value, now)
+        self._memory_size += len(value)
+        while self._memory_size > self.memory_bytes:
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+            self._stats['memory_evictions'] += 1
+
+    def _drop_memory(self, key):
+        value, _ = self._memory.pop(key)
+        self._memory_size -= len(value)
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + '.pdf')
+
+    def _disk_open(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            if now - os.stat(path).st_mtime > self.ttl:
+                os.unlink(path)
+                return None
+            file = open(path, 'rb')
+            os.utime(path)
+            return file
+        except FileNotFoundError:
+            # Never stored, or evicted by another process in the meantime
+            return None
+
+    def _disk_put(self, key, write, link_from=None):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                if link_from is not None and _try_link(link_from, tmp_path):
+                    os.close(fd)
+                else:
+                    with os.fdopen(fd, 'wb') as f:
+                        write(f)
+                size = os.path.getsize(tmp_path)
+                try:
+                    size -= os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+                os.replace(tmp_path, path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+            if self._disk_put_needs_scan(size):
+                self._evict_disk()
+        except OSError as e:
+            print(f"Error writing cache entry {key}: {e}")
+
+    def _disk_put_needs_scan(self, size):
+        """Add a write of size bytes to the running total and say whether the disk tier is due a scan"""
+        now = time.time()
+        with self._lock:
+            self._disk_puts += 1
+            if self._disk_size is not None:
+                self._disk_size += size
+            due = (self._disk_size is None or self._disk_size > self.disk_bytes
+                   or self._disk_puts >= DISK_SCAN_PUTS or now - self._disk_scanned >= DISK_SCAN_INTERVAL)
+            if due:
+                self._disk_puts = 0
+                self._disk_scanned = now
+            return due
+
+    def _evict_disk(self):
+        """Remove expired files, then, if over the size limit, least recently used ones down to DISK_EVICT_TARGET of it"""
+        now = time.time()
+        entries = []
+        total = 0
+        for bucket in os.scandir(self.disk_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if not entry.name.endswith('.pdf'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if now - st.st_mtime > self.ttl:
+                    self._unlink(entry.path)
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+        if total > self.disk_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.disk_bytes * DISK_EVICT_TARGET:
+                    break
+                self._unlink(path)
+                total -= size
+        with self._lock:
+            self._disk_size = total
+
+    def _unlink(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._stats['disk_evictions'] += 1
+
+
+def _copy_file(path, dest):
+    with open(path, 'rb') as source:
+        shutil.copyfileobj(source, dest, 1024 * 1024)
+
+
+def _try_link(source, tmp_path):
+    """Replace tmp_path with a hard link to source; False if they are on different filesystems"""
+    link_path = tmp_path + '.link'
+    try:
+        os.link(source, link_path)
+    except OSError:
+        return False
+    os.replace(link_path, tmp_path)
+    return True
@@ -0,0 +1,77 @@
+"""Converter registry.
+
+Each file type's module, and the libraries it needs (openpyxl, python-pptx,
+python-docx, reportlab, PIL), is only imported the first time a file of that
+type is converted, so starting the app and serving other routes stays cheap.
+
+Every converter takes a readable, seekable binary file and an optional
+writable binary `output` (a new BytesIO by default), writes the PDF to it and
+returns it rewound.
+
+File types listed in PART_PLANNERS can also be rendered piece by piece: the
+planner splits a file into parts, and the type's converters render only that
+part when given `part=`. Their section headings carry PDF bookmarks, so the
+rendered parts can be merged back into one outlined document.
+
+Inside converters.common.use_page_limit() every converter stops reading and
+laying out the file once the limit's last page is done. The Excel converters
+also take `max_rows=` to keep only the first rows of each sheet.
+"""
+import importlib
+import io
+
+# file type -> (module, {variant: converter function}); the first variant is the default
+REGISTRY = {
+    'excel': ('converters.excel', {'table': 'excel_to_pdf', 'streaming': 'excel_to_pdf_streaming'}),
+    'powerpoint': ('converters.powerpoint', {'default': 'pptx_to_pdf', 'faithful': 'pptx_to_pdf_faithful'}),
+    'word': ('converters.word', {'default': 'docx_to_pdf'}),
+    'text': ('converters.text', {'platypus': 'txt_to_pdf', 'fast': 'txt_to_pdf_fast'}),
+}
+
+# file type -> planner function in the same module, for types that can be rendered in parts
+PART_PLANNERS = {
+    'excel': 'excel_parts',
+    'powerpoint': 'pptx_parts',
+}
+
+
+def get_converter(file_type, variant=None):
+    """Return the converter function for a file type, importing its module on first use"""
+    if file_type not in REGISTRY:
+        raise ValueError(f'Unsupported file type: {file_type}')
+    module_name, variants = REGISTRY[file_type]
+    function_name = variants[variant] if variant else next(iter(variants.values()))
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def plan_parts(file_type, file, max_parts):
+    """Split a file into at most max_parts parts that render independently.
+
+    Returns an empty list for file types that cannot be split.
+    """
+    if file_type not in PART_PLANNERS:
+        return []
+    module = importlib.import_module(REGISTRY[file_type][0])
+    return getattr(module, PART_PLANNERS[file_type])(file, max_parts)
+
+
+def converter_modules():
+    """Return the module names of every registered converter"""
+    return [module_name for module_name, _ in REGISTRY.values()]
+
+
+def warm_converters():
+    """Import every converter and build the shared styles and font metrics.
+
+    Meant to run before the first request: in a gunicorn master with
+    --preload, after a worker forks, or as a pool worker's initializer.
+    """
+    for module_name in converter_modules():
+        importlib.import_module(module_name)
+
+    from converters.styles import theme_styles
+    from converters.text import txt_to_pdf
+
+    theme_styles()
+    # A one-line document loads the standard fonts and Platypus layout code paths
+    txt_to_pdf(io.BytesIO(b'warm-up'))
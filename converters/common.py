@@ -0,0 +1,202 @@
+"""Flowable and canvas helpers shared by the converters"""
+import contextvars
+import io
+import itertools
+import zlib
+from contextlib import contextmanager
+
+from lxml import etree
+from PIL import Image
+from reportlab import rl_config
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFDictionary, PDFName, PDFStream
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Flowable, Paragraph
+
+from converters.quality import quality_settings
+
+_outline_keys = itertools.count()
+
+# Write streams as binary: ASCII85 makes them a quarter larger, and without
+# reportlab's C accelerator encoding it costs more than rendering the page
+rl_config.useA85 = 0
+
+RESAMPLING_FILTERS = {'lanczos': Image.LANCZOS, 'bilinear': Image.BILINEAR}
+
+# Parts of uploaded packages are untrusted: never expand entities or fetch external DTDs
+XML_PARSER_OPTIONS = {'resolve_entities': False, 'no_network': True}
+
+_page_limit = contextvars.ContextVar('page_limit', default=None)
+_fragment_cache = contextvars.ContextVar('fragment_cache', default=None)
+
+
+@contextmanager
+def use_page_limit(last_page):
+    """Stop conversions inside this block once `last_page` pages are done; None renders every page"""
+    token = _page_limit.set(last_page)
+    try:
+        yield
+    finally:
+        _page_limit.reset(token)
+
+
+def page_limit():
+    """Return the page limit in effect, or None"""
+    return _page_limit.get()
+
+
+@contextmanager
+def use_fragment_cache(cache, key_parts=()):
+    """Let converters inside this block reuse rendered pieces of a file from `cache` (a ConversionCache).
+
+    key_parts name everything besides the piece's content that changes its
+    output, such as the converter version and options. A None cache turns
+    reuse off.
+    """
+    token = _fragment_cache.set((cache, tuple(key_parts)) if cache is not None else None)
+    try:
+        yield
+    finally:
+        _fragment_cache.reset(token)
+
+
+def fragment_cache():
+    """Return the (cache, key_parts) in effect, or None"""
+    return _fragment_cache.get()
+
+
+def parse_xml(data):
+    """Parse an XML part of an uploaded package with XML_PARSER_OPTIONS"""
+    return etree.fromstring(data, etree.XMLParser(**XML_PARSER_OPTIONS))
+
+
+class PageLimitReached(Exception):
+    """Raised by CompressingCanvas when the page limit's last page is finished, to stop layout early"""
+
+    def __init__(self, canvas):
+        super().__init__(f'Stopped after page {canvas.getPageNumber() - 1}')
+        self.canvas = canvas
+
+
+def build_pdf(doc, flowables):
+    """Build a document on a CompressingCanvas, saving it as soon as the page limit is reached"""
+    try:
+        doc.build(flowables, canvasmaker=CompressingCanvas)
+    except PageLimitReached as stop:
+        stop.canvas.save()
+
+
+class OutlinedHeading(Paragraph):
+    """Paragraph that adds a top-level PDF bookmark for itself when drawn.
+
+    Parts rendered separately keep their bookmarks when merged, since pypdf
+    imports each part's outline.
+    """
+
+    def __init__(self, text, style, title):
+        super().__init__(text, style)
+        self.outline_title = title
+
+    def draw(self):
+        key = f'outline{next(_outline_keys)}'
+        self.canv.bookmarkHorizontal(key, 0, self.height)
+        self.canv.addOutlineEntry(self.outline_title, key, level=0)
+        super().draw()
+
+
+class SharedImage(Flowable):
+    """Image flowable that draws a shared ImageReader.
+
+    reportlab stores identical ImageReader content as a single XObject, so
+    every flowable built from the same reader reuses one embedded image.
+    """
+
+    def __init__(self, reader, width, height):
+        super().__init__()
+        self.reader = reader
+        self.drawWidth = width
+        self.drawHeight = height
+        self.hAlign = 'CENTER'
+
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.drawWidth, self.drawHeight, mask='auto')
+
+
+def prepare_image(blob, display_width):
+    """Return an ImageReader for an image blob, downsampled for its display width in points.
+
+    The resolution and JPEG quality come from the quality preset in effect.
+    """
+    settings = quality_settings()
+    pil_img = Image.open(io.BytesIO(blob))
+    max_width = int(display_width / inch * settings['image_dpi'])
+    
+    if pil_img.width <= max_width:
+        # Already small enough; JPEGs are embedded without re-encoding
+        return ImageReader(io.BytesIO(blob))
+    
+    height = max(1, round(pil_img.height * max_width / pil_img.width))
+    # JPEGs can be decoded straight at a fraction of their size
+    pil_img.draft(pil_img.mode, (max_width, height))
+    if pil_img.mode == 'P':
+        pil_img = pil_img.convert('RGBA')
+    pil_img = pil_img.resize((max_width, height), RESAMPLING_FILTERS[settings['resample']], reducing_gap=3.0)
+    
+    if pil_img.mode in ('RGB', 'L', 'CMYK'):
+        # Re-encode opaque images as JPEG so they stay compact inside the PDF
+        jpeg = io.BytesIO()
+        pil_img.save(jpeg, format='JPEG', quality=settings['jpeg_quality'], optimize=True)
+        jpeg.seek(0)
+        return ImageReader(jpeg)
+    return ImageReader(pil_img)
+
+
+class LazyFlowables(list):
+    """Flowable list that is filled from a generator while the PDF is built.
+
+    SimpleDocTemplate.build() pops flowables off the front of the list, so
+    only `lookahead` items (plus any split remainders) are alive at once.
+    """
+
+    def __init__(self, source, lookahead=1):
+        super().__init__()
+        self._source = iter(source)
+        self._lookahead = lookahead
+
+    def __len__(self):
+        while self._source is not None and list.__len__(self) < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+        return list.__len__(self)
+
+class CompressingCanvas(canvas.Canvas):
+    """Canvas that deflates each page's content stream as soon as the page is done.
+
+    reportlab normally keeps every page's uncompressed drawing operators until
+    save(), which makes memory grow with page count on long documents.
+    Streams are compressed at the quality preset's compression level, and
+    finishing the last page allowed by use_page_limit() raises PageLimitReached.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compression_level = quality_settings()['compression_level']
+        self._page_limit = page_limit()
+
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if page.stream and page.compression and not page.Contents:
+            content = page.stream.encode('utf8') if isinstance(page.stream, str) else page.stream
+            dictionary = PDFDictionary({'Filter': PDFArray([PDFName('FlateDecode')])})
+            page.Contents = PDFStream(dictionary, zlib.compress(content, self._compression_level))
+            page.Contents.__Comment__ = "page stream"
+            page.stream = None
+        if self._page_limit is not None and len(self._doc.Pages.pages) >= self._page_limit:
+            raise PageLimitReached(self)
@@ -0,0 +1,412 @@
+"""Excel workbook conversion, in memory or streamed from a read-only workbook, optionally sheet by sheet from cached fragments"""
+import hashlib
+import io
+import re
+import time
+from itertools import repeat
+from operator import is_not
+from xml.sax.saxutils import escape
+
+from openpyxl import load_workbook
+from openpyxl.xml.constants import ARC_STYLE
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+
+from cache import cache_hasher
+from converters.common import LazyFlowables, OutlinedHeading, build_pdf, fragment_cache, page_limit
+from converters.styles import TABLE_LAYOUTS, theme_styles
+from metrics import stage, record_stage
+from pdfmerge import merge_pdfs
+
+# Text metrics of the 'sheet' table layout, used to size columns without measuring every cell
+EXCEL_BODY_FONT_SIZE = TABLE_LAYOUTS['sheet']['body_font_size']
+EXCEL_HEADER_FONT_SIZE = TABLE_LAYOUTS['sheet']['header_font_size']
+EXCEL_CHAR_WIDTH = 0.556 * EXCEL_BODY_FONT_SIZE  # Helvetica digit width; close to the average for text
+EXCEL_CELL_PADDING = 12  # Default 6pt left and right cell padding
+EXCEL_MIN_COL_WIDTH = 0.35*inch
+EXCEL_MAX_WRAPPED_LINES = 60  # Longer wrapped cells are cut off, since a table row cannot split across pages
+EXCEL_MAX_ROWS_PER_PAGE = 70  # Most table rows a portrait page holds; bounds the rows read under a page limit
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024  # Bytes of sheet XML hashed at a time
+# Index of a cell's shared string. A match holds no '</' before its last
+# byte, so chunks cut right after a '</' never split one
+SHARED_STRING_CELL = re.compile(rb'<(?:\w+:)?c\b[^>]*\bt="s"[^>]*>\s*<(?:\w+:)?v>(\d+)<')
+
+def excel_parts(excel_file, max_parts):
+    """Split the sheets into at most max_parts runs of consecutive sheet names, for rendering in parallel.
+
+    Every part loads the whole workbook, and openpyxl scans all sheets on load
+    when they lack a dimension record, so sheets are grouped per worker
+    rather than rendered one per part.
+    """
+    wb = load_workbook(excel_file, read_only=True)
+    try:
+        sheet_names = wb.sheetnames
+    finally:
+        wb.close()
+    part_count = min(max(max_parts, 1), len(sheet_names))
+    return [sheet_names[len(sheet_names) * i // part_count:len(sheet_names) * (i + 1) // part_count]
+            for i in range(part_count)]
+
+def excel_to_pdf(excel_file, output=None, part=None, max_rows=None):
+    """Convert Excel file to PDF, or only the sheets named in part.
+
+    max_rows limits each sheet to its header and that many rows. Under a
+    page limit, sheets stop being read once they hold more rows than the
+    allowed pages could show.
+    """
+    # Load the workbook read-only: cells are parsed as rows are iterated, and
+    # empty cells in sparse sheets never become Cell objects
+    with stage('parse'):
+        wb = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        if part is None and max_rows is None and renders_incrementally(wb):
+            return excel_to_pdf_incremental(wb, _excel_table_pdf, output)
+        return _excel_table_pdf(wb, part if part is not None else wb.sheetnames, output, max_rows)
+    finally:
+        wb.close()
+
+def _excel_table_pdf(wb, sheet_names, output=None, max_rows=None):
+    """Render the named sheets of an open workbook as sized tables"""
+    flowables_start = time.perf_counter()
+    show_sheet_names = len(wb.sheetnames) > 1
+    
+    # Read every sheet once, trimmed to its used range
+    row_budget = page_limit() * EXCEL_MAX_ROWS_PER_PAGE if page_limit() is not None else None
+    sheets = []
+    for sheet_name in sheet_names:
+        if row_budget is not None and row_budget <= 0:
+            break
+        sheet_rows = max_rows + 1 if max_rows is not None else None
+        if row_budget is not None:
+            sheet_rows = min(sheet_rows or row_budget, row_budget)
+        data, col_chars = read_sheet(wb[sheet_name], sheet_rows)
+        sheets.append((sheet_name, (data, col_chars)))
+        if row_budget is not None:
+            row_budget -= max(len(data), 1)
+    
+    # Use landscape when any sheet is more than 8 columns wide, portrait otherwise
+    max_cols_in_any_sheet = max((len(col_chars) for _, (_, col_chars) in sheets), default=0)
+    use_landscape = max_cols_in_any_sheet > 8
+    pagesize = landscape(A4) if use_landscape else A4
+    available_width = pagesize[0] - 0.5*inch
+    
+    # Create PDF in the caller's output (or in memory) with appropriate orientation
+    pdf_buffer = output if output is not None else io.BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=pagesize, leftMargin=0.25*inch, rightMargin=0.25*inch, topMargin=0.25*inch, bottomMargin=0.25*inch)
+    
+    elements = []
+    styles = theme_styles()
+    
+    # Process each sheet
+    for sheet_name, (data, col_chars) in sheets:
+        # Add sheet name as header
+        if show_sheet_names:
+            header = OutlinedHeading(escape(sheet_name), styles['Heading2'], sheet_name)
+            elements.append(header)
+            elements.append(Spacer(1, 0.1*inch))
+        
+        if data:
+            # Size columns to their content and wrap any cell that still does not fit
+            col_widths = column_widths(col_chars, available_width)
+            wrap_overflowing_cells(data, col_chars, col_widths)
+            
+            table = Table(data, colWidths=col_widths)
+            table.setStyle(styles.table('sheet'))
+            
+            elements.append(table)
+            elements.append(Spacer(1, 0.15*inch))
+    
+    # Build PDF
+    if not elements:
+        elements.append(Paragraph("No data found in the spreadsheet.", styles['Normal']))
+    record_stage('flowables', flowables_start)
+    
+    with stage('build'):
+        build_pdf(doc, elements)
+    pdf_buffer.seek(0)
+    
+    return pdf_buffer
+
+def read_sheet(ws, max_rows=None):
+    """Read a sheet, or its first max_rows rows, in one pass and return (rows, col_chars) trimmed to its used range.
+
+    rows are lists of cell strings up to the last non-empty row, padded to the
+    last non-empty column. col_chars[i] is the longest text in column i in
+    body-font characters, with header text scaled up to its larger font. The
+    trailing-empty-cell searches run in C through map() and list.index(),
+    and only cells up to a row's last value are converted to strings.
+    """
+    rows = []
+    col_chars = []
+    last_row = 0
+    header_scale = EXCEL_HEADER_FONT_SIZE / EXCEL_BODY_FONT_SIZE
+    
+    # A read-only sheet stops parsing its XML once max_row is passed
+    for row in ws.iter_rows(max_row=max_rows, values_only=True):
+        # Cut the row after its last non-empty cell, searching from the end in C
+        used = len(row) - _index_or_len(list(map(is_not, reversed(row), repeat(None))), True)
+        cells = ['' if cell is None else str(cell) for cell in row[:used]]
+        lengths = list(map(len, cells))
+        used = len(lengths) - _index_or_len(list(map(bool, reversed(lengths))), True)
+        del cells[used:]
+        rows.append(cells)
+        if not used:
+            continue
+        
+        last_row = len(rows)
+        if last_row == 1:
+            lengths = [length * header_scale for length in lengths]
+        if used > len(col_chars):
+            col_chars.extend([0] * (used - len(col_chars)))
+        col_chars[:used] = map(max, col_chars, lengths[:used])
+    
+    width = len(col_chars)
+    data = rows[:last_row]
+    for cells in data:
+        if len(cells) < width:
+            cells.extend([''] * (width - len(cells)))
+    return data, col_chars
+
+def _index_or_len(items, value):
+    try:
+        return items.index(value)
+    except ValueError:
+        return len(items)
+
+def column_widths(col_chars, available_width, min_width=EXCEL_MIN_COL_WIDTH):
+    """Split available_width between columns in proportion to their content.
+
+    When everything fits, columns are stretched proportionally to fill the
+    width. Otherwise columns that fit in an equal share of what is left get
+    exactly what they need, and the remaining width goes to the wider columns
+    in proportion to their content. No column is narrower than min_width.
+    """
+    natural = [max(chars * EXCEL_CHAR_WIDTH + EXCEL_CELL_PADDING, min_width) for chars in col_chars]
+    total = sum(natural)
+    if total <= available_width:
+        scale = available_width / total
+        return [width * scale for width in natural]
+    
+    widths = [None] * len(natural)
+    remaining = available_width
+    open_cols = list(range(len(natural)))
+    while open_cols:
+        share = remaining / len(open_cols)
+        fitting = [i for i in open_cols if natural[i] <= share]
+        if not fitting:
+            break
+        for i in fitting:
+            widths[i] = natural[i]
+            remaining -= natural[i]
+        open_cols = [i for i in open_cols if widths[i] is None]
+    
+    wide_total = sum(natural[i] for i in open_cols)
+    for i in open_cols:
+        widths[i] = max(remaining * natural[i] / wide_total, min_width)
+    return widths
+
+def wrap_overflowing_cells(data, col_chars, col_widths):
+    """Replace cells too long for their column with wrapping Paragraphs, in place"""
+    styles = theme_styles()
+    for col, (chars, width) in enumerate(zip(col_chars, col_widths)):
+        line_chars = max(int((width - EXCEL_CELL_PADDING) / EXCEL_CHAR_WIDTH), 1)
+        if chars <= line_chars:
+            continue
+        max_chars = line_chars * EXCEL_MAX_WRAPPED_LINES
+        for row_index, row in enumerate(data):
+            text = row[col]
+            limit = line_chars / (EXCEL_HEADER_FONT_SIZE / EXCEL_BODY_FONT_SIZE) if row_index == 0 else line_chars
+            if len(text) <= limit:
+                continue
+            if len(text) > max_chars:
+                text = text[:max_chars] + '...'
+            text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\n', '<br/>')
+            row[col] = Paragraph(text, styles['sheetHeaderCell'] if row_index == 0 else styles['sheetCell'])
+
+def excel_to_pdf_streaming(excel_file, output=None, part=None, max_rows=None):
+    """Convert Excel file, or only the sheets named in part, to PDF in one read-only pass with bounded memory.
+
+    max_rows limits each sheet to its header and that many rows. Workbooks
+    are never rendered incrementally here, since holding and merging every
+    sheet's fragment would make memory grow with the output again.
+    """
+    with stage('parse'):
+        wb = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        return _excel_streaming_pdf(wb, part if part is not None else wb.sheetnames, output, max_rows)
+    finally:
+        wb.close()
+
+def _excel_streaming_pdf(wb, sheet_names, output=None, max_rows=None):
+    """Render the named sheets of an open read-only workbook as page-sized table chunks"""
+    show_sheet_names = len(wb.sheetnames) > 1
+    sheets = [wb[sheet_name] for sheet_name in sheet_names]
+
+    # Read-only sheets expose their <dimension> hint without scanning any rows;
+    # sheets written without one only have their first rows sampled
+    max_cols_in_any_sheet = 0
+    for ws in sheets:
+        if ws.max_column is not None:
+            max_cols_in_any_sheet = max(max_cols_in_any_sheet, ws.max_column)
+        else:
+            for row in ws.iter_rows(max_row=100, values_only=True):
+                max_cols_in_any_sheet = max(max_cols_in_any_sheet, len([c for c in row if c is not None]))
+    use_landscape = max_cols_in_any_sheet > 8
+    pagesize = landscape(A4) if use_landscape else A4
+
+    pdf_buffer = output if output is not None else io.BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=pagesize, leftMargin=0.25*inch, rightMargin=0.25*inch, topMargin=0.25*inch, bottomMargin=0.25*inch)
+
+    # Rows are read and laid out inside build, so this stage covers both
+    with stage('build'):
+        build_pdf(doc, LazyFlowables(_excel_streaming_flowables(doc, sheets, show_sheet_names, max_rows)))
+    pdf_buffer.seek(0)
+
+    return pdf_buffer
+
+def _excel_streaming_flowables(doc, sheets, show_sheet_names, max_rows=None):
+    """Yield sheet headers and page-sized table chunks for a read-only workbook"""
+    styles = theme_styles()
+    available_width = doc.pagesize[0] - 0.5*inch
+    min_col_width = EXCEL_MIN_COL_WIDTH
+
+    # Measure the header and body row heights once for this page layout
+    sample = Table([['X'], ['X']], colWidths=[available_width])
+    sample.setStyle(styles.table('sheet'))
+    sample.wrap(available_width, doc.height)
+    header_height, row_height = sample._rowHeights
+
+    def rows_fitting_on_page():
+        # Size each chunk to the space left in the current frame so that
+        # chunks end on page boundaries, starting a fresh page if nothing fits
+        frame = getattr(doc, 'frame', None)
+        full_height = doc.height - 12  # Default frame padding is 6pt top and bottom
+        remaining = frame._y - frame._y1p if frame is not None else full_height
+        rows = int((remaining - header_height) // row_height)
+        if rows < 1:
+            rows = int((full_height - header_height) // row_height)
+        return max(rows, 1)
+
+    def make_table(header, chunk, width):
+        data = [list(header) + [''] * (width - len(header))]
+        for row in chunk:
+            data.append(list(row) + [''] * (width - len(row)))
+        col_width = max(available_width / width, min_col_width)
+        table = Table(data, colWidths=[col_width] * width, repeatRows=1)
+        table.setStyle(styles.table('sheet'))
+        return table
+
+    emitted = False
+    for ws in sheets:
+        if show_sheet_names:
+            yield OutlinedHeading(escape(ws.title), styles['Heading2'], ws.title)
+            yield Spacer(1, 0.1*inch)
+            emitted = True
+
+        header = None
+        width = 0
+        chunk = []
+        chunk_limit = None
+        pending_blank_rows = 0
+        sheet_has_table = False
+
+        for row in ws.iter_rows(max_row=max_rows + 1 if max_rows is not None else None, values_only=True):
+            # Drop trailing empty cells; the row's used width is what is left
+            used = len(row)
+            while used and row[used - 1] is None:
+                used -= 1
+            cells = tuple(str(cell) if cell is not None else '' for cell in row[:used])
+
+            if header is None:
+                header = cells
+                width = max(width, used)
+                continue
+
+            if not used:
+                # Only keep empty rows that turn out to have data after them
+                pending_blank_rows += 1
+                continue
+
+            width = max(width, used)
+            pending = [()] * pending_blank_rows + [cells]
+            pending_blank_rows = 0
+
+            for pending_row in pending:
+                if chunk_limit is None:
+                    chunk_limit = rows_fitting_on_page()
+                chunk.append(pending_row)
+                if len(chunk) >= chunk_limit:
+                    yield make_table(header, chunk, width)
+                    sheet_has_table = True
+                    chunk = []
+                    chunk_limit = None
+
+        if chunk or (width and not sheet_has_table):
+            yield make_table(header, chunk, width)
+            sheet_has_table = True
+
+        if sheet_has_table:
+            yield Spacer(1, 0.15*inch)
+            emitted = True
+
+    if not emitted:
+        yield Paragraph("No data found in the spreadsheet.", styles['Normal'])
+
+def renders_incrementally(wb):
+    """Whether a whole workbook is rendered sheet by sheet from the fragment cache"""
+    return fragment_cache() is not None and page_limit() is None and len(wb.sheetnames) > 1
+
+def excel_to_pdf_incremental(wb, render, output=None):
+    """Render each sheet of an open workbook on its own pages with `render`, reusing cached sheets, and merge them.
+
+    Each sheet's PDF fragment is cached under a fingerprint of its name and
+    cell values, so re-uploading an edited workbook only renders the sheets
+    that changed. Merging renumbers each sheet's pages and bookmarks.
+    """
+    cache, key_parts = fragment_cache()
+    archive = wb._archive
+    # Cell styles pick number formats, which decide whether numbers read as dates
+    styles = hashlib.sha256(archive.read(ARC_STYLE) if ARC_STYLE in archive.namelist() else b'').hexdigest()
+    fragments = []
+    for sheet_name in wb.sheetnames:
+        with stage('fingerprint'):
+            key = sheet_fingerprint(wb, sheet_name, render.__name__, wb.epoch, styles, *key_parts)
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = render(wb, [sheet_name]).getvalue()
+            cache.put(key, fragment)
+        fragments.append((None, fragment))
+    
+    with stage('merge'):
+        return merge_pdfs(fragments, output)
+
+def sheet_fingerprint(wb, sheet_name, *key_parts):
+    """Hash a sheet of an open read-only workbook, along with key_parts, into a cache key.
+
+    The sheet's XML is hashed as stored, without parsing any cells, except
+    that each shared-string index is replaced by the string it points to.
+    Strings another sheet adds to the shared table shift those indexes, so
+    hashing values rather than indexes keeps the key unchanged.
+    """
+    ws = wb[sheet_name]
+    shared_strings = ws._shared_strings
+    digest = cache_hasher('sheet', sheet_name, *key_parts)
+
+    def shared_string_value(match):
+        # Keep the cell's tags and swap the index for the length-prefixed value
+        value = str(shared_strings[int(match.group(1))]).encode('utf-8')
+        return match.group(0)[:match.start(1) - match.start()] + b'%d:' % len(value) + value + b'<'
+
+    tail = b''
+    with wb._archive.open(ws._worksheet_path) as xml:
+        for chunk in iter(lambda: xml.read(FINGERPRINT_CHUNK_SIZE), b''):
+            text = tail + chunk
+            cut = text.rfind(b'</') + 2
+            if cut < 2:
+                tail = text
+                continue
+            digest.update(SHARED_STRING_CELL.sub(shared_string_value, text[:cut]))
+            tail = text[cut:]
+    digest.update(SHARED_STRING_CELL.sub(shared_string_value, tail))
+    return digest.hexdigest()
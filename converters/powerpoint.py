@@ -0,0 +1,656 @@
+"""PowerPoint conversion.
+
+The default mode lists each slide's pictures followed by its text, one slide
+per A4 page. The faithful mode draws every shape at its position on pages
+the size of the slides.
+"""
+import colorsys
+import hashlib
+import io
+import time
+
+from lxml import etree
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE, PP_PLACEHOLDER
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.oxml.ns import qn
+from pptx.shapes.connector import Connector
+from pptx.shapes.picture import Picture
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.lib.utils import simpleSplit
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
+
+from converters.common import CompressingCanvas, OutlinedHeading, PageLimitReached, SharedImage, build_pdf, page_limit, parse_xml, prepare_image
+from converters.styles import theme_styles
+from metrics import stage, record_stage
+from pdfmerge import PageRangeError
+
+# Faithful mode
+EMU_PER_POINT = 12700
+PPTX_DEFAULT_SLIDE_SIZE = (9144000, 6858000)  # 10 x 7.5 inches, for decks that do not set one
+PPTX_DEFAULT_FONT_SIZE = 18
+PPTX_LINE_SPACING = 1.2
+PPTX_FONTS = {
+    (False, False): 'Helvetica',
+    (True, False): 'Helvetica-Bold',
+    (False, True): 'Helvetica-Oblique',
+    (True, True): 'Helvetica-BoldOblique',
+}
+PPTX_SCHEME_ALIASES = {'tx1': 'dk1', 'bg1': 'lt1', 'tx2': 'dk2', 'bg2': 'lt2'}
+PPTX_TITLE_PLACEHOLDERS = {'title', 'ctrTitle'}
+PPTX_BODY_PLACEHOLDERS = {'body', 'obj', 'subTitle'}
+# Slide placeholder type -> the master placeholder it inherits from; everything else inherits from the body
+PPTX_MASTER_PLACEHOLDERS = {
+    'title': PP_PLACEHOLDER.TITLE,
+    'ctrTitle': PP_PLACEHOLDER.TITLE,
+    'dt': PP_PLACEHOLDER.DATE,
+    'ftr': PP_PLACEHOLDER.FOOTER,
+    'sldNum': PP_PLACEHOLDER.SLIDE_NUMBER,
+}
+
+def pptx_parts(pptx_file, max_parts):
+    """Split the slides into at most max_parts (first, last) ranges, for rendering in parallel"""
+    slide_count = len(Presentation(pptx_file).slides)
+    per_part = max(-(-slide_count // max(max_parts, 1)), 1)
+    return [(first, min(first + per_part - 1, slide_count)) for first in range(1, slide_count + 1, per_part)]
+
+def slide_range(prs, part):
+    """Return the (first, last) slides to render: part's range, cut short under a page limit.
+
+    Every slide takes at least one page, so slides past the limit are never read.
+    A range running past the end stops at the last slide; one starting past
+    it raises PageRangeError, as ?pages= does.
+    """
+    slide_count = len(prs.slides)
+    first_slide, last_slide = part if part is not None else (1, slide_count)
+    if part is not None and first_slide > slide_count:
+        raise PageRangeError(f'Presentation has only {slide_count} slides')
+    last_slide = min(last_slide, slide_count)
+    if page_limit() is not None:
+        last_slide = min(last_slide, first_slide + page_limit() - 1)
+    return first_slide, last_slide
+
+def pptx_to_pdf(pptx_file, output=None, part=None):
+    """Convert PowerPoint file to PDF with images, or only the (first, last) slides in part"""
+    try:
+        # Load the presentation
+        with stage('parse'):
+            prs = Presentation(pptx_file)
+        flowables_start = time.perf_counter()
+        first_slide, last_slide = slide_range(prs, part)
+        
+        # Create PDF in the caller's output, or in memory
+        pdf_buffer = output if output is not None else io.BytesIO()
+        doc = SimpleDocTemplate(pdf_buffer, pagesize=A4)
+        
+        elements = []
+        styles = theme_styles()
+        image_readers = {}  # Prepared images by content hash
+        
+        # Get page dimensions
+        page_width = A4[0] - 2*inch  # Leave 1 inch margin on each side
+        
+        # Process each slide
+        for slide_idx, slide in enumerate(prs.slides, 1):
+            if not first_slide <= slide_idx <= last_slide:
+                continue
+            try:
+                # Add slide number header
+                header = OutlinedHeading(f"Slide {slide_idx}", styles['Heading2'], f"Slide {slide_idx}")
+                elements.append(header)
+                elements.append(Spacer(1, 0.15*inch))
+                
+                # Extract and add images from slide
+                slide_has_images = False
+                
+                for shape in slide.shapes:
+                    try:
+                        if hasattr(shape, "image"):
+                            # Get the image
+                            image = shape.image
+                            
+                            try:
+                                # Calculate scaling to fit page width while maintaining aspect ratio
+                                display_width = min(page_width, 5*inch)  # Max 5 inches wide
+                                
+                                # Decode each distinct picture once; repeats share one PDF XObject
+                                digest = hashlib.sha1(image.blob).hexdigest()
+                                if digest not in image_readers:
+                                    image_readers[digest] = prepare_image(image.blob, display_width)
+                                reader = image_readers[digest]
+                                
+                                img_width, img_height = reader.getSize()
+                                aspect = img_height / float(img_width)
+                                display_height = display_width * aspect
+                                
+                                # Add image to PDF straight from memory
+                                elements.append(SharedImage(reader, display_width, display_height))
+                                elements.append(Spacer(1, 0.1*inch))
+                                slide_has_images = True
+                            except Exception as e:
+                                print(f"Error processing image in slide {slide_idx}: {e}")
+                                continue
+                    
+                    except Exception as e:
+                        print(f"Error extracting image from shape: {e}")
+                        continue
+                
+                # Extract text from shapes
+                slide_text = []
+                for shape in slide.shapes:
+                    try:
+                        if hasattr(shape, "text") and shape.text.strip():
+                            slide_text.append(shape.text.strip())
+                    except Exception as e:
+                        print(f"Error extracting text from shape: {e}")
+                        continue
+                
+                # Add text content
+                if slide_text:
+                    for text in slide_text:
+                        try:
+                            # Clean and format text
+                            text = text.replace('\r\n', '<br/>').replace('\n', '<br/>')
+                            para = Paragraph(text, styles['Normal'])
+                            elements.append(para)
+                            elements.append(Spacer(1, 0.1*inch))
+                        except Exception as e:
+                            print(f"Error adding text to PDF: {e}")
+                            continue
+                elif not slide_has_images:
+                    # If no text and no images, add placeholder
+                    para = Paragraph("<i>[Empty slide]</i>", styles['Normal'])
+                    elements.append(para)
+                    elements.append(Spacer(1, 0.1*inch))
+                
+                # Add page break between slides (except last one)
+                if slide_idx < last_slide:
+                    elements.append(PageBreak())
+            
+            except Exception as e:
+                print(f"Error processing slide {slide_idx}: {e}")
+                continue
+        
+        # Build PDF
+        if not elements:
+            # If no elements were added, add a message
+            elements.append(Paragraph("No content could be extracted from the presentation.", styles['Normal']))
+        record_stage('flowables', flowables_start)
+        
+        try:
+            with stage('build'):
+                build_pdf(doc, elements)
+        except Exception as e:
+            print(f"Error building PDF: {e}")
+            raise
+        
+        pdf_buffer.seek(0)
+        
+        return pdf_buffer
+    
+    except Exception as e:
+        print(f"Fatal error in pptx_to_pdf: {e}")
+        raise
+
+def pptx_to_pdf_faithful(pptx_file, output=None, part=None):
+    """Convert PowerPoint file to PDF with each shape at its position, or only the (first, last) slides in part.
+
+    Shapes are drawn straight onto a canvas the size of the slides, with no
+    Platypus layout pass, and each page is compressed as soon as its slide
+    is done, so memory stays flat on long decks.
+    """
+    with stage('parse'):
+        prs = Presentation(pptx_file)
+    slide_width = prs.slide_width or PPTX_DEFAULT_SLIDE_SIZE[0]
+    slide_height = prs.slide_height or PPTX_DEFAULT_SLIDE_SIZE[1]
+    pagesize = (slide_width / EMU_PER_POINT, slide_height / EMU_PER_POINT)
+    first_slide, last_slide = slide_range(prs, part)
+    
+    pdf_buffer = output if output is not None else io.BytesIO()
+    canv = CompressingCanvas(pdf_buffer, pagesize=pagesize)
+    themes = {}  # SlideTheme by master part name
+    image_readers = {}  # Prepared images by content hash and display width
+    
+    with stage('build'):
+        try:
+            for slide_idx, slide in enumerate(prs.slides, 1):
+                if not first_slide <= slide_idx <= last_slide:
+                    continue
+                master = slide.slide_layout.slide_master
+                if master.part.partname not in themes:
+                    themes[master.part.partname] = SlideTheme(master)
+                painter = SlidePainter(canv, pagesize[1], themes[master.part.partname], image_readers)
+                try:
+                    painter.draw_slide(slide, slide_idx)
+                except Exception as e:
+                    print(f"Error drawing slide {slide_idx}: {e}")
+                canv.showPage()
+        except PageLimitReached:
+            pass
+        canv.save()
+    pdf_buffer.seek(0)
+    
+    return pdf_buffer
+
+class SlideTheme:
+    """Theme colors and default text styles of a slide master"""
+
+    def __init__(self, master):
+        self.colors = {}
+        theme = parse_xml(master.part.part_related_by(RT.THEME).blob)
+        scheme = theme.find('.//' + qn('a:clrScheme'))
+        for entry in (scheme if scheme is not None else []):
+            if len(entry):
+                self.colors[etree.QName(entry).localname] = entry[0].get('lastClr') or entry[0].get('val')
+        
+        # (style, level) -> defaults from the master's titleStyle, bodyStyle and otherStyle
+        self.text_styles = {}
+        tx_styles = master._element.find(qn('p:txStyles'))
+        for style_name in ('titleStyle', 'bodyStyle', 'otherStyle'):
+            style = tx_styles.find(qn(f'p:{style_name}')) if tx_styles is not None else None
+            for level in range(1, 10):
+                ppr = style.find(qn(f'a:lvl{level}pPr')) if style is not None else None
+                self.text_styles[(style_name, level)] = self.paragraph_style(ppr)
+
+    def paragraph_style(self, ppr):
+        """Return the text properties an lvlNpPr element sets, leaving out the ones it does not"""
+        style = {}
+        if ppr is None:
+            return style
+        rpr = ppr.find(qn('a:defRPr'))
+        if rpr is not None:
+            if rpr.get('sz'):
+                style['size'] = int(rpr.get('sz')) / 100
+            if rpr.get('b'):
+                style['bold'] = rpr.get('b') in ('1', 'true')
+            color = self.color(rpr.find(qn('a:solidFill')))
+            if color:
+                style['color'] = color
+        if ppr.get('algn'):
+            style['align'] = ppr.get('algn')
+        if ppr.get('marL'):
+            style['margin'] = int(ppr.get('marL'))
+        if ppr.find(qn('a:buChar')) is not None:
+            style['bullet'] = ppr.find(qn('a:buChar')).get('char')
+        elif ppr.find(qn('a:buNone')) is not None:
+            style['bullet'] = None
+        return style
+
+    def text_style(self, style_name, level, inherited=()):
+        """Return the default text properties of a paragraph level.
+
+        inherited are the txBody elements of the layout and master placeholders
+        a shape inherits from, nearest first; their list styles override the
+        master's text styles.
+        """
+        style = dict(self.text_styles.get((style_name, level), {}))
+        for tx_body in reversed(inherited):
+            list_style = tx_body.find(qn('a:lstStyle'))
+            if list_style is not None:
+                style.update(self.paragraph_style(list_style.find(qn(f'a:lvl{level}pPr'))))
+        return style
+
+    def color(self, element):
+        """Return the hex RGB of the color inside a fill or style reference element, or None"""
+        if element is None:
+            return None
+        for choice in element:
+            name = etree.QName(choice).localname
+            if name == 'srgbClr':
+                value = choice.get('val')
+            elif name == 'schemeClr':
+                value = self.colors.get(PPTX_SCHEME_ALIASES.get(choice.get('val'), choice.get('val')))
+            elif name == 'sysClr':
+                value = choice.get('lastClr')
+            else:
+                continue
+            return _adjust_luminance(value, choice) if value else None
+        return None
+
+def _adjust_luminance(value, choice):
+    """Apply lumMod/lumOff modifiers, which themes use for lighter and darker shades"""
+    lum_mod = choice.find(qn('a:lumMod'))
+    lum_off = choice.find(qn('a:lumOff'))
+    if lum_mod is None and lum_off is None:
+        return value
+    r, g, b = (int(value[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    h, l, s = colorsys.rgb_to_hls(r, g, b)
+    if lum_mod is not None:
+        l *= int(lum_mod.get('val')) / 100000
+    if lum_off is not None:
+        l += int(lum_off.get('val')) / 100000
+    r, g, b = colorsys.hls_to_rgb(h, min(max(l, 0.0), 1.0), s)
+    return '%02X%02X%02X' % (round(r * 255), round(g * 255), round(b * 255))
+
+def _hex_color(value):
+    return colors.HexColor('#' + value)
+
+class SlidePainter:
+    """Draws one slide's shapes onto a canvas at their EMU positions.
+
+    Positions inside groups are mapped through a (x offset, y offset,
+    x scale, y scale) transform from the group's child coordinates to slide EMUs.
+    """
+
+    IDENTITY = (0, 0, 1, 1)
+
+    def __init__(self, canv, page_height, theme, image_readers):
+        self.canv = canv
+        self.page_height = page_height
+        self.theme = theme
+        self.image_readers = image_readers
+        self.layout = None
+
+    def draw_slide(self, slide, slide_idx):
+        key = f'slide{slide_idx}'
+        self.canv.bookmarkPage(key)
+        self.canv.addOutlineEntry(f"Slide {slide_idx}", key, level=0)
+        
+        layout = self.layout = slide.slide_layout
+        self.draw_background(slide)
+        # Artwork on the master and layout (logos, bars) shows through; their placeholders do not
+        show_master = slide._element.get('showMasterSp') != '0'
+        if show_master and layout._element.get('showMasterSp') != '0':
+            self.draw_shapes([shape for shape in layout.slide_master.shapes if not shape.is_placeholder], self.IDENTITY)
+        if show_master:
+            self.draw_shapes([shape for shape in layout.shapes if not shape.is_placeholder], self.IDENTITY)
+        self.draw_shapes(slide.shapes, self.IDENTITY)
+
+    def draw_background(self, slide):
+        for source in (slide, slide.slide_layout, slide.slide_layout.slide_master):
+            bg = source._element.cSld.bg
+            if bg is not None:
+                break
+        else:
+            return
+        
+        bg_pr = bg.find(qn('p:bgPr'))
+        color = self.fill_color(bg_pr)[1] if bg_pr is not None else self.theme.color(bg.find(qn('p:bgRef')))
+        if color:
+            self.canv.setFillColor(_hex_color(color))
+            width = self.canv._pagesize[0]
+            self.canv.rect(0, 0, width, self.page_height, stroke=0, fill=1)
+
+    def draw_shapes(self, shapes, transform):
+        for shape in shapes:
+            try:
+                self.draw_shape(shape, transform)
+            except Exception as e:
+                print(f"Error drawing shape {shape.name}: {e}")
+
+    def draw_shape(self, shape, transform):
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            self.draw_shapes(shape.shapes, self.group_transform(shape, transform))
+            return
+        if isinstance(shape, Connector):
+            self.draw_connector(shape, transform)
+            return
+        if shape.left is None or shape.width is None:
+            # Placeholder with no position on the slide, layout or master
+            return
+        
+        x, y, width, height = self.box(transform, shape.left, shape.top, shape.width, shape.height)
+        self.canv.saveState()
+        try:
+            if shape.rotation:
+                self.canv.translate(x + width / 2, y + height / 2)
+                self.canv.rotate(-shape.rotation)
+                self.canv.translate(-x - width / 2, -y - height / 2)
+            
+            if isinstance(shape, Picture):
+                self.draw_picture(shape, x, y, width, height)
+            elif getattr(shape, 'has_table', False):
+                self.draw_table(shape, x, y, width, height)
+            elif shape._element.tag == qn('p:sp'):
+                self.draw_geometry(shape, x, y, width, height)
+                self.draw_text(shape._element.txBody, x, y, width, height, *self.text_context(shape),
+                               default_color=self.style_color(shape, 'a:fontRef'))
+        finally:
+            self.canv.restoreState()
+
+    def box(self, transform, left, top, width, height):
+        """Map an EMU box through transform to (x, y, width, height) in PDF points"""
+        ox, oy, sx, sy = transform
+        width = width * sx / EMU_PER_POINT
+        height = height * sy / EMU_PER_POINT
+        x = (ox + left * sx) / EMU_PER_POINT
+        y = self.page_height - (oy + top * sy) / EMU_PER_POINT - height
+        return x, y, width, height
+
+    def group_transform(self, group, transform):
+        xfrm = group._element.grpSpPr.find(qn('a:xfrm'))
+        if xfrm is None or xfrm.off is None or xfrm.chOff is None:
+            return transform
+        ox, oy, sx, sy = transform
+        scale_x = xfrm.ext.cx / xfrm.chExt.cx if xfrm.chExt.cx else 1
+        scale_y = xfrm.ext.cy / xfrm.chExt.cy if xfrm.chExt.cy else 1
+        group_x = xfrm.off.x - xfrm.chOff.x * scale_x
+        group_y = xfrm.off.y - xfrm.chOff.y * scale_y
+        return (ox + group_x * sx, oy + group_y * sy, sx * scale_x, sy * scale_y)
+
+    def fill_color(self, sp_pr):
+        """Return (explicit, hex color) for a shape's fill; explicit is False when the spPr sets none"""
+        if sp_pr is None:
+            return False, None
+        if sp_pr.find(qn('a:noFill')) is not None:
+            return True, None
+        solid = sp_pr.find(qn('a:solidFill'))
+        if solid is not None:
+            return True, self.theme.color(solid)
+        stop = sp_pr.find(qn('a:gradFill') + '/' + qn('a:gsLst') + '/' + qn('a:gs'))
+        if stop is not None:
+            # Gradients are approximated by their first stop
+            return True, self.theme.color(stop)
+        return False, None
+
+    def style_color(self, shape, ref_name):
+        """Return the color a shape's theme style gives its fill or outline, or None"""
+        style = shape._element.find(qn('p:style'))
+        ref = style.find(qn(ref_name)) if style is not None else None
+        if ref is None or ref.get('idx') == '0':
+            return None
+        return self.theme.color(ref)
+
+    def line_style(self, shape):
+        """Return (hex color, width in points) of a shape's outline, or (None, 0)"""
+        ln = shape._element.spPr.find(qn('a:ln'))
+        width = int(ln.get('w')) / EMU_PER_POINT if ln is not None and ln.get('w') else 0.75
+        explicit, color = self.fill_color(ln)
+        if not explicit:
+            color = self.style_color(shape, 'a:lnRef')
+        return color, width
+
+    def draw_geometry(self, shape, x, y, width, height):
+        sp_pr = shape._element.spPr
+        explicit, fill = self.fill_color(sp_pr)
+        if not explicit:
+            fill = self.style_color(shape, 'a:fillRef')
+        line, line_width = self.line_style(shape)
+        if fill is None and line is None:
+            return
+        
+        if fill:
+            self.canv.setFillColor(_hex_color(fill))
+        if line:
+            self.canv.setStrokeColor(_hex_color(line))
+            self.canv.setLineWidth(line_width)
+        geometry = sp_pr.find(qn('a:prstGeom'))
+        preset = geometry.get('prst') if geometry is not None else 'rect'
+        if preset == 'ellipse':
+            self.canv.ellipse(x, y, x + width, y + height, stroke=int(bool(line)), fill=int(bool(fill)))
+        elif preset == 'roundRect':
+            radius = min(width, height) / 6
+            self.canv.roundRect(x, y, width, height, radius, stroke=int(bool(line)), fill=int(bool(fill)))
+        else:
+            # Other presets and custom geometry are drawn as their bounding box
+            self.canv.rect(x, y, width, height, stroke=int(bool(line)), fill=int(bool(fill)))
+
+    def draw_connector(self, shape, transform):
+        x1, y1, _, _ = self.box(transform, shape.begin_x, shape.begin_y, 0, 0)
+        x2, y2, _, _ = self.box(transform, shape.end_x, shape.end_y, 0, 0)
+        color, width = self.line_style(shape)
+        self.canv.setStrokeColor(_hex_color(color or self.theme.colors.get('dk1', '000000')))
+        self.canv.setLineWidth(width)
+        self.canv.line(x1, y1, x2, y2)
+
+    def draw_picture(self, shape, x, y, width, height):
+        blob = shape.image.blob
+        key = (hashlib.sha1(blob).hexdigest(), round(width))
+        if key not in self.image_readers:
+            self.image_readers[key] = prepare_image(blob, width)
+        reader = self.image_readers[key]
+        
+        crop_left, crop_right = shape.crop_left, shape.crop_right
+        crop_top, crop_bottom = shape.crop_top, shape.crop_bottom
+        if crop_left or crop_right or crop_top or crop_bottom:
+            # Draw the whole picture scaled so the kept region fills the box, clipped to it
+            full_width = width / max(1 - crop_left - crop_right, 0.01)
+            full_height = height / max(1 - crop_top - crop_bottom, 0.01)
+            path = self.canv.beginPath()
+            path.rect(x, y, width, height)
+            self.canv.clipPath(path, stroke=0, fill=0)
+            x -= crop_left * full_width
+            y -= crop_bottom * full_height
+            width, height = full_width, full_height
+        self.canv.drawImage(reader, x, y, width, height, mask='auto')
+
+    def draw_table(self, shape, x, y, width, height):
+        table = shape.table
+        scale_x = width / (shape.width / EMU_PER_POINT)
+        scale_y = height / (shape.height / EMU_PER_POINT)
+        accent = self.theme.colors.get('accent1', '4472C4')
+        col_widths = [column.width / EMU_PER_POINT * scale_x for column in table.columns]
+        
+        top = y + height
+        for row_idx, row in enumerate(table.rows):
+            row_height = row.height / EMU_PER_POINT * scale_y
+            left = x
+            header = row_idx == 0 and table.first_row
+            for col_idx, cell in enumerate(row.cells):
+                if cell.is_spanned:
+                    left += col_widths[col_idx]
+                    continue
+                cell_width = sum(col_widths[col_idx:col_idx + cell.span_width])
+                cell_height = sum(
+                    r.height / EMU_PER_POINT * scale_y for r in list(table.rows)[row_idx:row_idx + cell.span_height])
+                
+                explicit, fill = self.fill_color(cell._tc.tcPr)
+                if not explicit:
+                    # Approximates the default Medium Style 2 table look
+                    fill = accent if header else ('CFD5EA' if row_idx % 2 and table.horz_banding else 'E9EBF5')
+                if fill:
+                    self.canv.setFillColor(_hex_color(fill))
+                self.canv.setStrokeColor(colors.white)
+                self.canv.setLineWidth(1)
+                self.canv.rect(left, top - cell_height, cell_width, cell_height, stroke=1, fill=int(bool(fill)))
+                self.draw_text(cell._tc.txBody, left, top - cell_height, cell_width, cell_height, 'otherStyle',
+                               default_color='FFFFFF' if header else None, default_bold=bool(header))
+                left += col_widths[col_idx]
+            top -= row_height
+
+    def text_context(self, shape):
+        """Return the master text style name, whether a shape is a title, and the txBody elements it inherits"""
+        if not shape.is_placeholder or self.layout is None:
+            return 'otherStyle', False, []
+        ph_type = shape._element.ph.get('type', 'obj')
+        layout_placeholder = self.layout.placeholders.get(idx=shape.placeholder_format.idx)
+        master_placeholder = self.layout.slide_master.placeholders.get(
+            PPTX_MASTER_PLACEHOLDERS.get(ph_type, PP_PLACEHOLDER.BODY))
+        inherited = [
+            base._element.txBody for base in (layout_placeholder, master_placeholder)
+            if base is not None and base._element.txBody is not None
+        ]
+        if ph_type in PPTX_TITLE_PLACEHOLDERS:
+            return 'titleStyle', True, inherited
+        if ph_type in PPTX_BODY_PLACEHOLDERS:
+            return 'bodyStyle', False, inherited
+        return 'otherStyle', False, inherited
+
+    def draw_text(self, tx_body, x, y, width, height, style_name, title=False, inherited=(),
+                  default_color=None, default_bold=False):
+        """Lay out a text body inside its box, wrapping each paragraph to the box width"""
+        if tx_body is None:
+            return
+        body_pr = tx_body.find(qn('a:bodyPr'))
+        if body_pr is None:
+            body_pr = etree.Element(qn('a:bodyPr'))
+        left = int(body_pr.get('lIns', 91440)) / EMU_PER_POINT
+        right = int(body_pr.get('rIns', 91440)) / EMU_PER_POINT
+        top = int(body_pr.get('tIns', 45720)) / EMU_PER_POINT
+        bottom = int(body_pr.get('bIns', 45720)) / EMU_PER_POINT
+        wrap = body_pr.get('wrap') != 'none'
+        autofit = body_pr.find(qn('a:normAutofit'))
+        font_scale = int(autofit.get('fontScale', 100000)) / 100000 if autofit is not None else 1
+        text_width = max(width - left - right, 1)
+        
+        # Lines as (text, font, size, hex color, align, indent, bullet)
+        lines = []
+        for paragraph in tx_body.findall(qn('a:p')):
+            ppr = paragraph.find(qn('a:pPr'))
+            level = int(ppr.get('lvl', 0)) + 1 if ppr is not None else 1
+            style = self.theme.text_style(style_name, level, inherited)
+            style.update(self.theme.paragraph_style(ppr))
+            
+            text = []
+            rpr = None
+            for child in paragraph:
+                name = etree.QName(child).localname
+                if name in ('r', 'fld'):
+                    if rpr is None:
+                        rpr = child.find(qn('a:rPr'))
+                    text.append(child.findtext(qn('a:t')) or '')
+                elif name == 'br':
+                    text.append('\n')
+            if rpr is None:
+                rpr = paragraph.find(qn('a:endParaRPr'))
+            text = ''.join(text)
+            
+            size = int(rpr.get('sz')) / 100 if rpr is not None and rpr.get('sz') else style.get('size') or PPTX_DEFAULT_FONT_SIZE
+            size *= font_scale
+            bold = rpr.get('b') in ('1', 'true') if rpr is not None and rpr.get('b') else style.get('bold') or default_bold
+            italic = rpr is not None and rpr.get('i') in ('1', 'true')
+            color = self.theme.color(rpr.find(qn('a:solidFill'))) if rpr is not None else None
+            color = color or default_color or style.get('color') or self.theme.colors.get('dk1', '000000')
+            align = style.get('align', 'l')
+            indent = style.get('margin', 0) / EMU_PER_POINT
+            bullet = style.get('bullet') if text else None
+            font = PPTX_FONTS[(bool(bold), bool(italic))]
+            
+            for segment_idx, segment in enumerate(text.split('\n')):
+                wrapped = simpleSplit(segment, font, size, max(text_width - indent, size)) if wrap else [segment]
+                for line_idx, line in enumerate(wrapped or ['']):
+                    first = segment_idx == 0 and line_idx == 0
+                    lines.append((line, font, size, color, align, indent, bullet if first else None))
+        if not any(line[0] for line in lines):
+            return
+        
+        text_height = sum(size * PPTX_LINE_SPACING for _, _, size, _, _, _, _ in lines)
+        anchor = body_pr.get('anchor')
+        for base in inherited:
+            base_pr = base.find(qn('a:bodyPr'))
+            anchor = anchor or (base_pr.get('anchor') if base_pr is not None else None)
+        anchor = anchor or ('ctr' if title else 't')
+        if anchor == 'ctr':
+            cursor = y + height - top - max(height - top - bottom - text_height, 0) / 2
+        elif anchor == 'b':
+            cursor = y + bottom + text_height
+        else:
+            cursor = y + height - top
+        
+        for line, font, size, color, align, indent, bullet in lines:
+            baseline = cursor - size
+            cursor -= size * PPTX_LINE_SPACING
+            if not line:
+                continue
+            self.canv.setFont(font, size)
+            self.canv.setFillColor(_hex_color(color))
+            if bullet:
+                self.canv.drawString(x + left + max(indent - size, 0), baseline, bullet)
+            if align == 'ctr':
+                self.canv.drawCentredString(x + left + indent + (text_width - indent) / 2, baseline, line)
+            elif align == 'r':
+                self.canv.drawRightString(x + width - right, baseline, line)
+            else:
+                self.canv.drawString(x + left + indent, baseline, line)
@@ -0,0 +1,65 @@
+"""Output quality presets that trade PDF size against conversion time.
+
+The preset in effect is set around a conversion with use_quality(). The
+converters read its stream compression level and image settings through
+quality_settings(). Presets with `optimize` set also rewrite the finished
+PDF with optimize_pdf().
+"""
+import contextvars
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# compression_level: zlib level for page content streams (1 fastest, 9 smallest)
+# image_dpi, jpeg_quality: pictures are downsampled to image_dpi at their display
+#   size and re-encoded as JPEGs of this quality
+# resample: 'lanczos' for the sharpest downsampling, 'bilinear' for the quickest
+# optimize: recompress every stream and pack objects into object streams afterwards
+QUALITY_PRESETS = {
+    'fast': {'compression_level': 1, 'image_dpi': 150, 'jpeg_quality': 75, 'resample': 'bilinear', 'optimize': False},
+    'balanced': {'compression_level': 6, 'image_dpi': 150, 'jpeg_quality': 85, 'resample': 'lanczos', 'optimize': False},
+    'smallest': {'compression_level': 9, 'image_dpi': 96, 'jpeg_quality': 60, 'resample': 'lanczos', 'optimize': True},
+}
+DEFAULT_QUALITY = 'balanced'
+
+_current_quality = contextvars.ContextVar('quality', default=DEFAULT_QUALITY)
+
+
+@contextmanager
+def use_quality(name):
+    """Convert with the named preset inside this block; None keeps DEFAULT_QUALITY"""
+    token = _current_quality.set(name or DEFAULT_QUALITY)
+    try:
+        yield
+    finally:
+        _current_quality.reset(token)
+
+
+def quality_settings():
+    """Return the settings of the preset in effect"""
+    return QUALITY_PRESETS[_current_quality.get()]
+
+
+def optimize_pdf(pdf_file, linearize=False):
+    """Rewrite a readable, writable PDF file in place with qpdf, returning it rewound.
+
+    Every stream is recompressed at the highest level and small objects are
+    packed into compressed object streams. With linearize, the first page's
+    objects are also moved to the front and hint tables added, so viewers
+    can show it before the whole file has downloaded.
+    """
+    # Imported here so only optimized conversions pay for loading qpdf
+    import pikepdf
+
+    pikepdf.settings.set_flate_compression_level(9)
+    pdf_file.seek(0)
+    with tempfile.TemporaryFile() as optimized:
+        with pikepdf.open(pdf_file) as pdf:
+            pdf.save(optimized, compress_streams=True, recompress_flate=True,
+                     object_stream_mode=pikepdf.ObjectStreamMode.generate, linearize=linearize)
+        optimized.seek(0)
+        pdf_file.seek(0)
+        pdf_file.truncate()
+        shutil.copyfileobj(optimized, pdf_file)
+    pdf_file.seek(0)
+    return pdf_file
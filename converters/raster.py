@@ -0,0 +1,29 @@
+"""PNG renderings of converted PDFs, one page at a time"""
+import io
+
+import pypdfium2
+
+
+def pdf_to_pngs(pdf_file, width, pages=None):
+    """Yield (page number, PNG bytes) for each page of a PDF, scaled to `width` pixels.
+
+    pdf_file is a path or a seekable binary file. Pages are rendered and
+    released one by one, so memory does not grow with the page count.
+    `pages` limits rendering to those 1-based page numbers.
+    """
+    pdf = pypdfium2.PdfDocument(pdf_file)
+    try:
+        for page_number in (pages if pages is not None else range(1, len(pdf) + 1)):
+            if not 1 <= page_number <= len(pdf):
+                continue
+            page = pdf[page_number - 1]
+            try:
+                bitmap = page.render(scale=width / page.get_width())
+                png = io.BytesIO()
+                bitmap.to_pil().save(png, format='PNG', optimize=True)
+                bitmap.close()
+            finally:
+                page.close()
+            yield page_number, png.getvalue()
+    finally:
+        pdf.close()
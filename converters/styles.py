@@ -0,0 +1,140 @@
+"""Paragraph and table styles, fonts and themes shared by every converter.
+
+Styles are built once per process for each theme and then shared read-only,
+so a conversion only looks them up. The theme in effect is set around a
+conversion with use_theme(); converters get its styles from theme_styles().
+"""
+import contextvars
+import functools
+import json
+from contextlib import contextmanager
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import TableStyle
+
+# Settings a theme may override; colours are hex strings and sizes are points
+DEFAULT_THEME = {
+    'font': 'Helvetica',
+    'bold_font': 'Helvetica-Bold',
+    'italic_font': 'Helvetica-Oblique',
+    'bold_italic_font': 'Helvetica-BoldOblique',
+    'font_files': {},  # Font name -> TrueType file, for fonts reportlab does not ship
+    'text_color': '#000000',
+    'header_color': '#4472C4',
+    'header_text_color': '#F5F5F5',
+    'body_color': '#D9E2F3',
+    'stripe_color': '#E7EEF7',
+    'grid_color': '#A6B4D0',
+    'body_font_size': 10,
+    'heading1_font_size': 14,
+    'heading2_font_size': 12,
+}
+
+# Table layouts by name: 'sheet' for spreadsheets, 'document' for tables inside documents
+TABLE_LAYOUTS = {
+    'sheet': {'align': 'CENTER', 'header_font_size': 7, 'body_font_size': 5, 'header_padding': 5},
+    'document': {'align': 'LEFT', 'header_font_size': 9, 'body_font_size': 8, 'header_padding': 8},
+}
+
+_current_theme = contextvars.ContextVar('theme', default=None)
+
+
+@contextmanager
+def use_theme(theme):
+    """Make theme_styles() return the styles of `theme` (a dict of DEFAULT_THEME overrides) inside this block"""
+    token = _current_theme.set(theme)
+    try:
+        yield
+    finally:
+        _current_theme.reset(token)
+
+
+def theme_styles():
+    """Return the ThemeStyles of the theme in effect, or of the default theme"""
+    return _compiled_styles(json.dumps(_current_theme.get() or {}, sort_keys=True))
+
+
+@functools.lru_cache(maxsize=32)
+def _compiled_styles(theme_json):
+    return ThemeStyles(json.loads(theme_json))
+
+
+@functools.lru_cache(maxsize=None)
+def register_font(name, path):
+    """Register a TrueType font under `name`, loading each file once per process"""
+    pdfmetrics.registerFont(TTFont(name, path))
+
+
+class ThemeStyles:
+    """Every paragraph and table style of one theme.
+
+    Index it by paragraph style name ('Normal', 'Heading1', 'Heading2', and
+    '<layout>Cell'/'<layout>HeaderCell' for wrapped table cells) and get
+    table styles with table(layout).
+    """
+
+    def __init__(self, theme):
+        theme = dict(DEFAULT_THEME, **theme)
+        for name, path in theme['font_files'].items():
+            register_font(name, path)
+        # Lets <b> and <i> markup switch between the theme's fonts
+        pdfmetrics.registerFontFamily(theme['font'], normal=theme['font'], bold=theme['bold_font'],
+                                      italic=theme['italic_font'], boldItalic=theme['bold_italic_font'])
+
+        self.font = theme['font']
+        self.bold_font = theme['bold_font']
+        # Canvas-level text drawing needs one of the 14 standard fonts
+        self.standard_font = self.font if self.font in pdfmetrics.standardFonts else 'Helvetica'
+
+        sample = getSampleStyleSheet()
+        text_color = colors.HexColor(theme['text_color'])
+        body_size = theme['body_font_size']
+        self.paragraphs = {
+            'Normal': ParagraphStyle('Normal', parent=sample['Normal'], fontName=self.font, fontSize=body_size,
+                                     leading=body_size * 1.2, textColor=text_color),
+        }
+        for level in (1, 2):
+            size = theme[f'heading{level}_font_size']
+            self.paragraphs[f'Heading{level}'] = ParagraphStyle(
+                f'Heading{level}', parent=sample[f'Heading{level}'], fontName=self.bold_font, fontSize=size,
+                leading=size * 1.25, textColor=text_color)
+
+        self.tables = {}
+        for layout_name, layout in TABLE_LAYOUTS.items():
+            self.tables[layout_name] = _table_style(theme, layout)
+            cell = ParagraphStyle(f'{layout_name}Cell', fontName=self.font, fontSize=layout['body_font_size'],
+                                  leading=layout['body_font_size'] * 1.2, alignment=TA_CENTER, textColor=text_color)
+            self.paragraphs[f'{layout_name}Cell'] = cell
+            self.paragraphs[f'{layout_name}HeaderCell'] = ParagraphStyle(
+                f'{layout_name}HeaderCell', parent=cell, fontName=self.bold_font, fontSize=layout['header_font_size'],
+                leading=layout['header_font_size'] * 1.2, textColor=colors.HexColor(theme['header_text_color']))
+
+    def __getitem__(self, name):
+        return self.paragraphs[name]
+
+    def table(self, layout_name):
+        """Return the TableStyle for a table layout"""
+        return self.tables[layout_name]
+
+
+def _table_style(theme, layout):
+    """Build a striped table style with a coloured header row"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(theme['header_color'])),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor(theme['header_text_color'])),
+        ('ALIGN', (0, 0), (-1, -1), layout['align']),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, 0), theme['bold_font']),
+        ('FONTSIZE', (0, 0), (-1, 0), layout['header_font_size']),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), layout['header_padding']),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor(theme['body_color'])),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor(theme['grid_color'])),
+        ('FONTNAME', (0, 1), (-1, -1), theme['font']),
+        ('FONTSIZE', (0, 1), (-1, -1), layout['body_font_size']),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor(theme['text_color'])),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor(theme['stripe_color'])]),
+    ])
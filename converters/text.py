@@ -0,0 +1,264 @@
+"""Text file conversion through Platypus, or drawn straight onto the canvas for large files"""
+import codecs
+import io
+import time
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+from converters.common import CompressingCanvas, PageLimitReached, build_pdf
+from converters.styles import theme_styles
+from metrics import stage, record_stage
+
+TEXT_CHUNK_SIZE = 64 * 1024  # Bytes of a text upload decoded at a time
+TEXT_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+def txt_to_pdf(txt_file, output=None):
+    """Convert text file to PDF"""
+    try:
+        # Read the text file, decoded the same way as the fast path
+        with stage('parse'):
+            lines = list(iter_text_lines(txt_file))
+        flowables_start = time.perf_counter()
+        
+        # Create PDF in the caller's output, or in memory
+        pdf_buffer = output if output is not None else io.BytesIO()
+        pdf_doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, leftMargin=0.75*inch, rightMargin=0.75*inch, topMargin=0.75*inch, bottomMargin=0.75*inch)
+        
+        elements = []
+        styles = theme_styles()
+        body_style = styles['Normal']
+        
+        for line in lines:
+            try:
+                line = line.rstrip()
+                
+                if not line.strip():
+                    # Add space for empty lines
+                    elements.append(Spacer(1, 0.1*inch))
+                else:
+                    # Escape special characters for PDF
+                    safe_line = line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                    para = Paragraph(safe_line, body_style)
+                    elements.append(para)
+                    elements.append(Spacer(1, 0.05*inch))
+            
+            except Exception as e:
+                print(f"Error processing line: {e}")
+                continue
+        
+        # Build PDF
+        if not elements:
+            elements.append(Paragraph("No content found in the text file.", styles['Normal']))
+        record_stage('flowables', flowables_start)
+        
+        with stage('build'):
+            build_pdf(pdf_doc, elements)
+        pdf_buffer.seek(0)
+        
+        return pdf_buffer
+    
+    except Exception as e:
+        print(f"Fatal error in txt_to_pdf: {e}")
+        raise
+
+class TextWidths(dict):
+    """Cache of string widths for one font and size, filled on first lookup"""
+
+    def __init__(self, font_name, font_size, max_entries=100000):
+        super().__init__()
+        self.font_name = font_name
+        self.font_size = font_size
+        self.max_entries = max_entries
+        self.char_widths = {}
+
+    def __missing__(self, text):
+        if len(self) >= self.max_entries:
+            self.clear()
+        width = 0.0
+        for char in text:
+            char_width = self.char_widths.get(char)
+            if char_width is None:
+                char_width = self.char_widths[char] = stringWidth(char, self.font_name, self.font_size)
+            width += char_width
+        self[text] = width
+        return width
+
+class PDFStringEscapes(dict):
+    """str.translate table that turns text into a PDF string for a WinAnsi font"""
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        try:
+            byte = char.encode('cp1252')[0]
+        except UnicodeEncodeError:
+            escaped = '?'
+        else:
+            if char in '\\()':
+                escaped = '\\' + char
+            elif 32 <= byte < 127:
+                escaped = char
+            else:
+                escaped = '\\%03o' % byte
+        self[codepoint] = escaped
+        return escaped
+
+PDF_STRING_ESCAPES = PDFStringEscapes()
+
+def iter_text_lines(txt_file, chunk_size=TEXT_CHUNK_SIZE):
+    """Yield the lines of a text upload, decoding it chunk by chunk with iter_text_chunks().
+
+    Like str.split('\\n'), a trailing newline yields a final empty line.
+    """
+    pending = ''
+    for text in iter_text_chunks(txt_file, chunk_size):
+        lines = (pending + text).split('\n')
+        pending = lines.pop()
+        yield from lines
+    yield pending
+
+def iter_text_chunks(txt_file, chunk_size=TEXT_CHUNK_SIZE):
+    """Yield a text upload decoded chunk by chunk.
+
+    A byte order mark selects UTF-8/16/32. Without one, the first chunk decides
+    between UTF-8 and Windows-1252, so legacy ANSI files are not shredded into
+    replacement characters. UTF-8 text is decoded strictly, and the first
+    byte that is not UTF-8 switches the rest of the file to Windows-1252.
+    """
+    chunk = txt_file.read(chunk_size)
+    
+    encoding = 'utf-8'
+    for bom, bom_encoding in TEXT_BOMS:
+        if chunk.startswith(bom):
+            encoding = bom_encoding
+            break
+    else:
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(chunk, final=False)
+        except UnicodeDecodeError:
+            encoding = 'cp1252'
+    
+    decoder = codecs.getincrementaldecoder(encoding)(errors='strict' if encoding == 'utf-8' else 'replace')
+    while True:
+        final = not chunk
+        buffered = decoder.getstate()[0]
+        try:
+            yield decoder.decode(chunk, final=final)
+        except UnicodeDecodeError as e:
+            # e.start counts from the bytes the decoder held back from the last chunk
+            data = buffered + chunk
+            yield data[:e.start].decode('utf-8') + data[e.start:].decode('cp1252', errors='replace')
+            decoder = codecs.getincrementaldecoder('cp1252')(errors='replace')
+        if final:
+            break
+        chunk = txt_file.read(chunk_size)
+
+def wrap_text_line(line, widths, max_width):
+    """Greedily wrap a single-spaced line into pieces no wider than max_width"""
+    words = line.split(' ')
+    space_width = widths[' ']
+    if sum(map(widths.__getitem__, words)) + space_width * (len(words) - 1) <= max_width:
+        return [line]
+    
+    pieces = []
+    current = []
+    current_width = 0.0
+    for word in words:
+        word_width = widths[word]
+        if current and current_width + space_width + word_width <= max_width:
+            current.append(word)
+            current_width += space_width + word_width
+            continue
+        if current:
+            pieces.append(' '.join(current))
+        # Break words that are wider than a whole line on character boundaries
+        while word_width > max_width:
+            cut_width = 0.0
+            for cut, char in enumerate(word):
+                cut_width += widths.char_widths.get(char) or widths[char]
+                if cut_width > max_width:
+                    break
+            cut = max(cut, 1)
+            pieces.append(word[:cut])
+            word = word[cut:]
+            word_width = widths[word]
+        current = [word]
+        current_width = word_width
+    if current:
+        pieces.append(' '.join(current))
+    return pieces
+
+def txt_to_pdf_fast(txt_file, output=None):
+    """Convert text file to PDF by writing text operators straight to the canvas"""
+    pdf_buffer = output if output is not None else io.BytesIO()
+    canv = CompressingCanvas(pdf_buffer, pagesize=A4)
+    
+    # Mirror the Platypus layout of txt_to_pdf: Normal style text in a frame
+    # with 0.75 inch margins, 0.05 inch after each line, 0.1 inch per blank line
+    styles = theme_styles()
+    font_name, font_size, leading = styles.standard_font, styles['Normal'].fontSize, styles['Normal'].leading
+    margin = 0.75*inch + 6
+    left = margin
+    max_width = A4[0] - 2*margin
+    top = A4[1] - margin
+    bottom = margin
+    widths = TextWidths(font_name, font_size)
+    # Lines this short fit whatever their characters are, so skip measuring them
+    always_fits = int(max_width // stringWidth('W', font_name, font_size * 1.1))
+    
+    operators = []
+    y = top
+    has_content = False
+    
+    def add_space(space):
+        # Like a Spacer in Platypus: one that does not fit moves to the next page
+        nonlocal y
+        if y - space < bottom:
+            finish_page()
+            y = top
+        y -= space
+    
+    def finish_page():
+        # Text state set by setFont persists into the literal BT/ET block
+        canv.setFont(font_name, font_size)
+        canv.addLiteral('BT\n' + '\n'.join(operators) + '\nET')
+        canv.showPage()
+        operators.clear()
+    
+    with stage('build'):
+        try:
+            for line in iter_text_lines(txt_file):
+                # Paragraph collapses runs of whitespace; do the same
+                line = ' '.join(line.split())
+                if not line:
+                    add_space(0.1*inch)
+                    continue
+                
+                pieces = [line] if len(line) <= always_fits else wrap_text_line(line, widths, max_width)
+                for piece in pieces:
+                    if y - leading < bottom:
+                        finish_page()
+                        y = top
+                    y -= leading
+                    operators.append('1 0 0 1 %.2f %.2f Tm (%s) Tj' % (left, y + leading - font_size, piece.translate(PDF_STRING_ESCAPES)))
+                    has_content = True
+                add_space(0.05*inch)
+            
+            if not has_content:
+                operators.append('1 0 0 1 %.2f %.2f Tm (No content found in the text file.) Tj' % (left, top - font_size))
+            finish_page()
+        except PageLimitReached:
+            # The rest of the file is never read
+            pass
+        canv.save()
+    
+    pdf_buffer.seek(0)
+    return pdf_buffer
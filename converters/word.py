@@ -0,0 +1,312 @@
+"""Word document conversion, streaming the document body in order"""
+import io
+import posixpath
+import zipfile
+from xml.sax.saxutils import escape
+
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from lxml import etree
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+
+from converters.common import XML_PARSER_OPTIONS, LazyFlowables, SharedImage, build_pdf, parse_xml, prepare_image
+from converters.styles import theme_styles
+from metrics import stage
+
+EMU_PER_POINT = 12700
+PACKAGE_RELS_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+VML_IMAGEDATA = '{urn:schemas-microsoft-com:vml}imagedata'
+
+def docx_to_pdf(docx_file, output=None):
+    """Convert Word document to PDF, keeping paragraphs, tables and pictures in document order"""
+    try:
+        # Open the package and read the styles and relationships the body refers to
+        with stage('parse'):
+            archive = zipfile.ZipFile(docx_file)
+            package = WordPackage(archive)
+        
+        # Create PDF in the caller's output, or in memory
+        pdf_buffer = output if output is not None else io.BytesIO()
+        pdf_doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, leftMargin=0.75*inch, rightMargin=0.75*inch, topMargin=0.75*inch, bottomMargin=0.75*inch)
+        
+        # The body is parsed and laid out inside build, so this stage covers both
+        try:
+            with stage('build'):
+                build_pdf(pdf_doc, LazyFlowables(_word_flowables(package, pdf_doc.width, pdf_doc.height)))
+        finally:
+            archive.close()
+        pdf_buffer.seek(0)
+        
+        return pdf_buffer
+    
+    except Exception as e:
+        print(f"Fatal error in docx_to_pdf: {e}")
+        raise
+
+class WordPackage:
+    """The parts of a .docx ZIP the converter needs, read without python-docx's object model"""
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.document_path = self._main_document_path()
+        self.relationships = self._relationships(self.document_path)
+        self.style_names = self._style_names()
+        self._image_readers = {}  # Prepared images by part path and display width
+
+    def _main_document_path(self):
+        rels = parse_xml(self.archive.read('_rels/.rels'))
+        for rel in rels.iter(PACKAGE_RELS_NS + 'Relationship'):
+            if rel.get('Type') == RT.OFFICE_DOCUMENT:
+                return rel.get('Target').lstrip('/')
+        return 'word/document.xml'
+
+    def _relationships(self, part_path):
+        """Map relationship ids of a part to the paths of the parts they target"""
+        folder, name = posixpath.split(part_path)
+        try:
+            rels = parse_xml(self.archive.read(posixpath.join(folder, '_rels', name + '.rels')))
+        except KeyError:
+            return {}
+        targets = {}
+        for rel in rels.iter(PACKAGE_RELS_NS + 'Relationship'):
+            if rel.get('TargetMode') != 'External':
+                target = rel.get('Target')
+                targets[rel.get('Id')] = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(folder, target))
+        return targets
+
+    def _style_names(self):
+        """Map paragraph style ids to lower-case style names; None maps to the default style"""
+        names = {}
+        styles_path = next((path for path in self.relationships.values() if path.endswith('/styles.xml')), 'word/styles.xml')
+        try:
+            styles = parse_xml(self.archive.read(styles_path))
+        except KeyError:
+            return names
+        for style in styles.iter(qn('w:style')):
+            if style.get(qn('w:type')) != 'paragraph':
+                continue
+            name = style.find(qn('w:name'))
+            name = name.get(qn('w:val')).lower() if name is not None else ''
+            names[style.get(qn('w:styleId'))] = name
+            if style.get(qn('w:default')) in ('1', 'true'):
+                names[None] = name
+        return names
+
+    def body_elements(self):
+        """Yield the document body's top-level elements in order, freeing each one after use"""
+        with self.archive.open(self.document_path) as source:
+            body_tag = qn('w:body')
+            for _, element in etree.iterparse(source, events=('end',), **XML_PARSER_OPTIONS):
+                parent = element.getparent()
+                if parent is None or parent.tag != body_tag:
+                    continue
+                yield element
+                # Drop the element and anything before it so the tree never grows
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
+
+    def image(self, rel_id, display_width):
+        """Return an ImageReader for a picture relationship, or None if it cannot be read"""
+        path = self.relationships.get(rel_id)
+        if path is None:
+            return None
+        key = (path, round(display_width))
+        if key not in self._image_readers:
+            self._image_readers[key] = prepare_image(self.archive.read(path), display_width)
+        return self._image_readers[key]
+
+def _word_flowables(package, frame_width, frame_height):
+    """Yield flowables for each body element as the document XML is parsed"""
+    styles = theme_styles()
+    emitted = False
+    
+    for element in package.body_elements():
+        try:
+            if element.tag == qn('w:p'):
+                flowables = _paragraph_flowables(package, element, styles, frame_width, frame_height)
+            elif element.tag == qn('w:tbl'):
+                flowables = _table_flowables(element, styles)
+            elif element.tag == qn('w:sdt'):
+                # Content controls (e.g. a table of contents) wrap ordinary paragraphs and tables
+                flowables = []
+                for child in element.iterfind(qn('w:sdtContent') + '/*'):
+                    if child.tag == qn('w:p'):
+                        flowables.extend(_paragraph_flowables(package, child, styles, frame_width, frame_height))
+                    elif child.tag == qn('w:tbl'):
+                        flowables.extend(_table_flowables(child, styles))
+            else:
+                continue
+        except Exception as e:
+            print(f"Error processing {etree.QName(element).localname} element: {e}")
+            continue
+        
+        for flowable in flowables:
+            emitted = True
+            yield flowable
+    
+    if not emitted:
+        yield Paragraph("No content found in the document.", styles['Normal'])
+
+def _paragraph_flowables(package, p, styles, frame_width, frame_height):
+    """Return the flowables for one w:p element, reading its runs once"""
+    style_id = p.find(qn('w:pPr') + '/' + qn('w:pStyle'))
+    style_name = package.style_names.get(style_id.get(qn('w:val')) if style_id is not None else None, 'normal')
+    
+    plain = []
+    formatted = []
+    images = []
+    page_break = False
+    for run in p.iter(qn('w:r')):
+        run_text = []
+        for child in run:
+            tag = child.tag
+            if tag == qn('w:t'):
+                run_text.append(escape(child.text or ''))
+            elif tag == qn('w:tab'):
+                run_text.append(' ')
+            elif tag == qn('w:br'):
+                if child.get(qn('w:type')) == 'page':
+                    page_break = True
+                else:
+                    run_text.append('<br/>')
+            elif tag in (qn('w:drawing'), qn('w:pict')):
+                images.extend(_run_images(child))
+        if not run_text:
+            continue
+        run_text = ''.join(run_text)
+        plain.append(run_text)
+        
+        rpr = run.find(qn('w:rPr'))
+        if rpr is not None:
+            if _toggle_on(rpr.find(qn('w:b'))):
+                run_text = f"<b>{run_text}</b>"
+            if _toggle_on(rpr.find(qn('w:i'))):
+                run_text = f"<i>{run_text}</i>"
+            underline = rpr.find(qn('w:u'))
+            if underline is not None and underline.get(qn('w:val')) != 'none':
+                run_text = f"<u>{run_text}</u>"
+        formatted.append(run_text)
+    
+    flowables = []
+    text = ''.join(plain).strip()
+    if not text:
+        if not images:
+            # Add space for empty paragraphs
+            flowables.append(Spacer(1, 0.1*inch))
+    elif 'heading 1' in style_name or style_name == 'title':
+        flowables.append(Paragraph(text, styles['Heading1']))
+        flowables.append(Spacer(1, 0.05*inch))
+    elif 'heading' in style_name:
+        flowables.append(Paragraph(text, styles['Heading2']))
+        flowables.append(Spacer(1, 0.05*inch))
+    else:
+        # Apply formatting from the paragraph's runs
+        flowables.append(Paragraph(''.join(formatted).strip(), styles['Normal']))
+        flowables.append(Spacer(1, 0.05*inch))
+    
+    for rel_id, width, height in images:
+        # Fit pictures inside the frame, keeping their aspect ratio
+        scale = min(1.0, frame_width / width, frame_height * 0.9 / height) if width and height else 1.0
+        try:
+            reader = package.image(rel_id, width * scale)
+        except Exception as e:
+            print(f"Error reading image {rel_id}: {e}")
+            continue
+        if reader is None:
+            continue
+        if not width or not height:
+            # VML pictures may not state a size; use the picture's own at 72 dpi
+            width, height = reader.getSize()
+            scale = min(1.0, frame_width / width, frame_height * 0.9 / height)
+        flowables.append(SharedImage(reader, width * scale, height * scale))
+        flowables.append(Spacer(1, 0.05*inch))
+    
+    if page_break:
+        flowables.append(PageBreak())
+    return flowables
+
+def _toggle_on(element):
+    """Whether a w:b/w:i style toggle element is present and not switched off"""
+    return element is not None and element.get(qn('w:val')) not in ('0', 'false', 'off')
+
+def _run_images(element):
+    """Return (relationship id, width, height) in points for the pictures in a w:drawing or w:pict"""
+    images = []
+    if element.tag == qn('w:drawing'):
+        for container in element:
+            extent = container.find(qn('wp:extent'))
+            width = int(extent.get('cx')) / EMU_PER_POINT if extent is not None else 0
+            height = int(extent.get('cy')) / EMU_PER_POINT if extent is not None else 0
+            for blip in container.iter(qn('a:blip')):
+                if blip.get(qn('r:embed')):
+                    images.append((blip.get(qn('r:embed')), width, height))
+    else:
+        for image_data in element.iter(VML_IMAGEDATA):
+            if image_data.get(qn('r:id')):
+                images.append((image_data.get(qn('r:id')), 0, 0))
+    return images
+
+def _table_flowables(tbl, styles):
+    """Return the flowables for one w:tbl element, with merged cells spanned"""
+    table_data = []
+    spans = []
+    # Vertical merges still open, by column: [first row, last row, columns spanned]
+    merges = {}
+    
+    def close_merge(col):
+        first_row, last_row, span = merges.pop(col)
+        if last_row > first_row or span > 1:
+            spans.append(('SPAN', (col, first_row), (col + span - 1, last_row)))
+    
+    for row_idx, tr in enumerate(tbl.iterfind(qn('w:tr'))):
+        row_data = []
+        for tc in tr.iterfind(qn('w:tc')):
+            tc_pr = tc.find(qn('w:tcPr'))
+            grid_span = tc_pr.find(qn('w:gridSpan')) if tc_pr is not None else None
+            span = int(grid_span.get(qn('w:val'))) if grid_span is not None else 1
+            v_merge = tc_pr.find(qn('w:vMerge')) if tc_pr is not None else None
+            col = len(row_data)
+            
+            if v_merge is not None and v_merge.get(qn('w:val')) != 'restart':
+                # Continuation of a vertically merged cell; its text is in the cell above
+                cell_text = ''
+                if col in merges:
+                    merges[col][1] = row_idx
+                elif span > 1:
+                    spans.append(('SPAN', (col, row_idx), (col + span - 1, row_idx)))
+            else:
+                cell_text = '\n'.join(
+                    ''.join(t.text or '' for t in p.iter(qn('w:t'))) for p in tc.iterfind(qn('w:p'))
+                ).strip()
+                if col in merges:
+                    close_merge(col)
+                if v_merge is not None:
+                    merges[col] = [row_idx, row_idx, span]
+                elif span > 1:
+                    spans.append(('SPAN', (col, row_idx), (col + span - 1, row_idx)))
+            row_data.append(cell_text)
+            row_data.extend([''] * (span - 1))
+        table_data.append(row_data)
+        # A merge ends at the first row that does not continue it
+        for col in [col for col, (_, last_row, _) in merges.items() if last_row < row_idx]:
+            close_merge(col)
+    for col in list(merges):
+        close_merge(col)
+    
+    if not table_data:
+        return []
+    width = max(len(row) for row in table_data)
+    for row in table_data:
+        row.extend([''] * (width - len(row)))
+    if not width:
+        return []
+    
+    # Create and style the table
+    pdf_table = Table(table_data)
+    pdf_table.setStyle(styles.table('document'))
+    if spans:
+        pdf_table.setStyle(TableStyle(spans))
+    return [pdf_table, Spacer(1, 0.2*inch)]
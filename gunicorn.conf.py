@@ -0,0 +1,24 @@
+"""Gunicorn settings: gthread workers with converters warmed before traffic arrives.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is preloaded in the master, which imports every converter once so
+forked workers share those pages. Each worker then starts its conversion
+pool, whose processes fork from a forkserver that has the converters loaded.
+Drop preload_app and post_fork to go back to loading converters on first use.
+"""
+worker_class = 'gthread'
+threads = 8
+preload_app = True
+
+
+def when_ready(server):
+    from converters import warm_converters
+
+    warm_converters()
+
+
+def post_fork(server, worker):
+    import app
+
+    app.warm_up()
@@ -0,0 +1,207 @@
+"""Bounded process pool and in-memory job registry for background conversions"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class QueueFullError(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+
+class Job:
+    """A conversion submitted through the job API"""
+
+    def __init__(self, future, filename, cleanup=None):
+        self.id = uuid.uuid4().hex
+        self.future = future
+        self.filename = filename
+        self.cleanup = cleanup
+        self.created = time.time()
+        self.finished = None
+        future.add_done_callback(self._stamp_finished)
+
+    def _stamp_finished(self, future):
+        self.finished = time.time()
+
+    @property
+    def status(self):
+        if self.future.done():
+            return 'failed' if self.future.exception() else 'finished'
+        if self.future.running():
+            return 'running'
+        return 'queued'
+
+    @property
+    def error(self):
+        if self.future.done() and self.future.exception():
+            return str(self.future.exception())
+        return None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'created': self.created,
+            'finished': self.finished,
+            'error': self.error,
+        }
+
+
+class ConversionPool:
+    """Run conversions on a ProcessPoolExecutor with a bounded number of slots.
+
+    At most `max_workers + max_queued` conversions are running or waiting at
+    any time; further submissions raise QueueFullError instead of queueing.
+    Coordinator threads started by submit_thread() are bounded the same way,
+    separately, so they never hold the slots their own pieces wait for.
+    With `max_workers=0` conversions run inline in the calling thread, for
+    platforms that cannot start worker processes.
+
+    `preload` names modules the forkserver imports once so every worker forks
+    with them loaded; `initializer` runs in each worker as it starts.
+    """
+
+    def __init__(self, max_workers, max_queued, result_ttl=600, initializer=None, preload=()):
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self.initializer = initializer
+        self.preload = list(preload)
+        self._slots = threading.BoundedSemaphore(max(max_workers, 1) + max_queued)
+        self._coordinators = threading.BoundedSemaphore(max(max_workers, 1) + max_queued)
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # forkserver avoids forking a web worker that already has threads running
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+                context = multiprocessing.get_context(method)
+                if method == 'forkserver' and self.preload:
+                    context.set_forkserver_preload(self.preload)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=context, initializer=self.initializer)
+            return self._executor
+
+    def start(self):
+        """Start every worker process now instead of on the first conversions"""
+        if self.max_workers == 0:
+            if self.initializer:
+                self.initializer()
+            return
+        executor = self._get_executor()
+        # Workers are spawned on demand, one per submission that finds none idle
+        futures = [executor.submit(os.getpid) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+
+    def dispatch(self, fn, *args, block=False):
+        """Start a conversion and return its Future without registering a Job.
+
+        With block=True this waits for a free slot instead of raising
+        QueueFullError.
+        """
+        if not self._slots.acquire(blocking=block):
+            raise QueueFullError('Conversion queue is full, please retry later')
+
+        try:
+            if self.max_workers == 0:
+                future = Future()
+                future.set_running_or_notify_cancel()
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                try:
+                    future = self._get_executor().submit(fn, *args)
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM-killed); start a fresh pool and retry once
+                    print("Conversion pool is broken, restarting it")
+                    with self._lock:
+                        self._executor = None
+                    future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+
+    def submit(self, fn, *args, filename=None, cleanup=None):
+        """Queue a conversion and return its Job.
+
+        `cleanup` is called once the job expires, e.g. to remove its result file.
+        """
+        return self._register(Job(self.dispatch(fn, *args), filename, cleanup))
+
+    def submit_thread(self, fn, *args, filename=None, cleanup=None):
+        """Run fn on a thread of this process and return its Job.
+
+        Meant for coordinators that dispatch their own pieces to the pool
+        with block=True, so waiting on them does not hold a worker slot.
+        Raises QueueFullError when as many coordinators as slots are running.
+        """
+        if not self._coordinators.acquire(blocking=False):
+            raise QueueFullError('Conversion queue is full, please retry later')
+
+        future = Future()
+
+        def run():
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+
+        future.add_done_callback(lambda f: self._coordinators.release())
+        try:
+            threading.Thread(target=run, daemon=True).start()
+        except Exception:
+            future.cancel()
+            raise
+        return self._register(Job(future, filename, cleanup))
+
+    def add_result(self, result, filename=None, cleanup=None):
+        """Register a Job that is already finished, e.g. served from a cache"""
+        future = Future()
+        future.set_running_or_notify_cancel()
+        future.set_result(result)
+        return self._register(Job(future, filename, cleanup))
+
+    def run(self, fn, *args, timeout=None, block=False):
+        """Run a conversion on the pool and wait for its result; block is passed to dispatch()"""
+        return self.dispatch(fn, *args, block=block).result(timeout=timeout)
+
+    def get(self, job_id):
+        """Return the Job with this id, or None if it is unknown or expired"""
+        self._expire_jobs()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _register(self, job):
+        self._expire_jobs()
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def _expire_jobs(self):
+        # Jobs are kept result_ttl seconds after they finish, however long they queued or ran
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.finished is not None and job.finished < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if job.cleanup is not None:
+                try:
+                    job.cleanup()
+                except Exception as e:
+                    print(f"Error cleaning up job {job.id}: {e}")
@@ -0,0 +1,116 @@
+"""Per-stage timing collection and Prometheus-style histograms"""
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, math.inf)
+SIZE_CLASSES = ((100 * 1024, '<100KB'), (1024 * 1024, '100KB-1MB'), (10 * 1024 * 1024, '1MB-10MB'))
+
+_stage_timings = contextvars.ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def collect_stages():
+    """Collect the timings of every stage() entered inside this block into a dict"""
+    timings = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage; a no-op outside collect_stages()"""
+    timings = _stage_timings.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def record_stage(name, start):
+    """Add the time elapsed since `start` (a time.perf_counter() value) to a stage"""
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def size_class(nbytes):
+    """Bucket an input size into a low-cardinality label"""
+    for limit, label in SIZE_CLASSES:
+        if nbytes < limit:
+            return label
+    return '>=10MB'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class Histogram:
+    """A labelled histogram rendered in the Prometheus text format"""
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = list(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {series['sum']!r}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """A set of histograms exposed together on /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,50 @@
+"""Merge converted PDFs into one document with an outline entry per part, and cut page ranges out of them"""
+import io
+
+
+class PageRangeError(ValueError):
+    """Raised when a requested page range starts past the end of a document"""
+
+
+def merge_pdfs(parts, output=None):
+    """Concatenate (title, pdf) parts in order into output (a new BytesIO by default).
+
+    Each pdf is bytes or a file path. Every part with a title gets a top-level
+    bookmark pointing at its first page. Returns output rewound.
+    """
+    # Imported here so only batch and parallel conversions pay for loading pypdf
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for title, pdf in parts:
+        writer.append(io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf, outline_item=title)
+
+    buffer = output if output is not None else io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def select_pages(pdf_file, first, last):
+    """Rewrite a readable, writable PDF file in place to hold only pages first..last (1-based).
+
+    A range running past the end stops at the last page. Bookmarks to kept
+    pages survive. Returns the file rewound.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    pdf_file.seek(0)
+    reader = PdfReader(pdf_file)
+    last = min(last, len(reader.pages))
+    if first > last:
+        raise PageRangeError(f'Document has only {last} pages')
+    writer = PdfWriter()
+    writer.append(reader, pages=(first - 1, last))
+    selected = io.BytesIO()
+    writer.write(selected)
+
+    pdf_file.seek(0)
+    pdf_file.truncate()
+    pdf_file.write(selected.getvalue())
+    pdf_file.seek(0)
+    return pdf_file
@@ -0,0 +1,94 @@
+"""Cheap checks of an upload's real format, run before it reaches a converter.
+
+Office uploads must be OOXML packages: ZIP archives whose central directory
+names the right main folder and stays within size limits. Only the first
+bytes and the central directory are read, so bad uploads are turned away
+in milliseconds instead of failing deep inside a parser on a pool worker.
+"""
+import codecs
+import zipfile
+
+OLE2_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'  # Legacy binary .xls, .ppt and .doc files
+ZIP_MAGICS = (b'PK\x03\x04', b'PK\x05\x06')
+TEXT_SNIFF_BYTES = 8192
+TEXT_WIDE_BOMS = (codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+RATIO_CHECK_BYTES = 1024 * 1024  # Compression ratios only matter for entries larger than this
+
+# OOXML file type -> (folder of its main part, description, legacy binary extension)
+OOXML_TYPES = {
+    'excel': ('xl/', 'an Excel workbook', '.xls'),
+    'powerpoint': ('ppt/', 'a PowerPoint presentation', '.ppt'),
+    'word': ('word/', 'a Word document', '.doc'),
+}
+
+
+class RejectedUpload(ValueError):
+    """Raised for an upload that will not be converted; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=415):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_upload(stream, file_type, max_uncompressed, max_entries, max_ratio):
+    """Check that a seekable upload really is a file_type file, raising RejectedUpload if not.
+
+    Leaves the stream at its start.
+    """
+    stream.seek(0)
+    head = stream.read(TEXT_SNIFF_BYTES if file_type == 'text' else len(OLE2_MAGIC))
+    stream.seek(0)
+
+    if file_type == 'text':
+        if b'\0' in head and not head.startswith(TEXT_WIDE_BOMS):
+            raise RejectedUpload('File is not a text file')
+        return
+
+    folder, description, legacy_extension = OOXML_TYPES[file_type]
+    if head.startswith(OLE2_MAGIC):
+        raise RejectedUpload(f'Legacy binary {legacy_extension} files are not supported; '
+                             f'save the file as {legacy_extension}x and upload it again')
+    if not head.startswith(ZIP_MAGICS):
+        raise RejectedUpload(f'File is not {description}')
+
+    try:
+        infos = check_zip(stream, max_uncompressed, max_entries, max_ratio)
+    finally:
+        stream.seek(0)
+    names = {info.filename for info in infos}
+    if '[Content_Types].xml' not in names:
+        raise RejectedUpload(f'File is not {description}')
+    if not any(name.startswith(folder) for name in names):
+        for other_folder, other_description, _ in OOXML_TYPES.values():
+            if any(name.startswith(other_folder) for name in names):
+                raise RejectedUpload(f'File is {other_description}, not {description}')
+        raise RejectedUpload(f'File is not {description}')
+
+
+def check_zip(stream, max_uncompressed, max_entries, max_ratio):
+    """Read a ZIP archive's central directory and return its entries, raising RejectedUpload
+    if it is malformed or would inflate past the limits.
+
+    Entries are never decompressed, and zipfile stops reading an entry at its
+    declared size, so the declared sizes bound what a converter can inflate.
+    """
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            infos = archive.infolist()
+    except (zipfile.BadZipFile, OSError, ValueError, EOFError):
+        raise RejectedUpload('File is corrupt or not a valid ZIP archive', 400)
+    check_zip_entries(infos, max_uncompressed, max_entries, max_ratio)
+    return infos
+
+
+def check_zip_entries(infos, max_uncompressed, max_entries, max_ratio):
+    """Raise RejectedUpload if ZIP entries (ZipInfo objects) exceed the count, size or ratio limits"""
+    if len(infos) > max_entries:
+        raise RejectedUpload(f'Archive has more than {max_entries} entries', 413)
+    total = 0
+    for info in infos:
+        total += info.file_size
+        if total > max_uncompressed:
+            raise RejectedUpload(f'Archive expands to more than {max_uncompressed // (1024 * 1024)}MB', 413)
+        if info.file_size > RATIO_CHECK_BYTES and info.file_size > max_ratio * max(info.compress_size, 1):
+            raise RejectedUpload(f'Archive entry {info.filename} is compressed more than {max_ratio}:1', 413)
@@ -11,8 +11,11 @@ const errorMessage = document.getElementById('errorMessage');
 const errorText = document.getElementById('errorText');
 const convertAnother = document.getElementById('convertAnother');
 const tryAgain = document.getElementById('tryAgain');
+const filePreview = document.getElementById('filePreview');
+const previewImage = document.getElementById('previewImage');
 
 let selectedFileObj = null;
+let previewUrl = null;
 
 // Handle file selection
 fileInput.addEventListener('change', (e) => {
@@ -73,6 +76,41 @@ function handleFileSelect(file) {
     
     uploadBox.style.display = 'none';
     selectedFile.style.display = 'block';
+    
+    showPreview(file);
+}
+
+async function showPreview(file) {
+    // Only page one is converted, so the preview arrives quickly even for large files
+    const formData = new FormData();
+    formData.append('file', file);
+    
+    try {
+        const response = await fetch('/preview', {
+            method: 'POST',
+            body: formData
+        });
+        if (!response.ok || file !== selectedFileObj) return;
+        
+        const blob = await response.blob();
+        if (file !== selectedFileObj) return;
+        clearPreview();
+        previewUrl = window.URL.createObjectURL(blob);
+        previewImage.src = previewUrl;
+        filePreview.style.display = 'block';
+    } catch (error) {
+        // The preview is optional; converting still works without it
+        console.error('Preview error:', error);
+    }
+}
+
+function clearPreview() {
+    filePreview.style.display = 'none';
+    previewImage.removeAttribute('src');
+    if (previewUrl) {
+        window.URL.revokeObjectURL(previewUrl);
+        previewUrl = null;
+    }
 }
 
 function formatFileSize(bytes) {
@@ -95,6 +133,7 @@ tryAgain.addEventListener('click', () => {
 
 function resetUpload() {
     selectedFileObj = null;
+    clearPreview();
     fileInput.value = '';
     uploadBox.style.display = 'block';
     selectedFile.style.display = 'none';
@@ -0,0 +1,16 @@
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Test client converting inline, with its spool and caches in a fresh temporary directory"""
+    config = app_module.app.config
+    monkeypatch.setitem(config, 'CONVERSION_WORKERS', 0)
+    monkeypatch.setitem(config, 'SPOOL_DIR', str(tmp_path / 'spool'))
+    monkeypatch.setitem(config, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setitem(config, 'FRAGMENT_CACHE_DIR', str(tmp_path / 'fragments'))
+    for name in ('_conversion_pool', '_result_cache', '_fragment_cache'):
+        monkeypatch.setattr(app_module, name, None)
+    return app_module.app.test_client()
@@ -0,0 +1,29 @@
+"""Per-file results of the /convert/batch endpoint"""
+import io
+import json
+import zipfile
+
+import app as app_module
+
+
+def zip_of(*names):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name in names:
+            archive.writestr(name, f'contents of {name}\n')
+    return buffer.getvalue()
+
+
+def test_archive_over_the_entry_limit_fails_only_its_own_entry(client, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'MAX_ZIP_ENTRIES', 1)
+
+    response = client.post('/convert/batch?output=zip', data={'files': [
+        (io.BytesIO(b'plain text\n'), 'notes.txt'),
+        (io.BytesIO(zip_of('a.txt', 'b.txt')), 'bundle.zip'),
+    ]})
+
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        manifest = json.loads(archive.read('manifest.json'))
+    assert manifest[0] == {'file': 'notes.txt', 'status': 'converted', 'output': 'notes.pdf'}
+    assert manifest[1]['file'] == 'bundle.zip' and manifest[1]['status'] == 'failed'
@@ -0,0 +1,15 @@
+"""Options of the /convert endpoint"""
+import io
+
+
+def post(client, query, data=b'first line\nsecond line\n', filename='notes.txt'):
+    return client.post(f'/convert?{query}', data={'file': (io.BytesIO(data), filename)})
+
+
+def test_profile_with_thumbnails_converts_a_cached_pdf(client):
+    assert post(client, '').status_code == 200
+
+    response = post(client, 'profile=1&output=thumbnails')
+
+    assert response.status_code == 200
+    assert response.get_json()['profile']
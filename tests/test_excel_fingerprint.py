@@ -0,0 +1,46 @@
+"""Sheet fingerprints used as fragment cache keys for incremental Excel conversion"""
+import io
+
+import xlsxwriter
+from openpyxl import load_workbook
+
+import converters.excel
+from converters.excel import sheet_fingerprint
+
+
+def make_workbook(sheets):
+    """Return a read-only workbook with one column of strings per sheet, written with shared strings"""
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer)
+    for name, values in sheets:
+        worksheet = workbook.add_worksheet(name)
+        for row, value in enumerate(values):
+            worksheet.write_string(row, 0, value)
+    workbook.close()
+    buffer.seek(0)
+    return load_workbook(buffer, read_only=True)
+
+
+def test_string_added_in_another_sheet_keeps_fingerprint():
+    before = make_workbook([('A', ['x', 'y']), ('B', ['p', 'q']), ('C', ['y', 'z'])])
+    after = make_workbook([('A', ['x', 'y', 'new']), ('B', ['p', 'q']), ('C', ['y', 'z'])])
+
+    assert sheet_fingerprint(before, 'A') != sheet_fingerprint(after, 'A')
+    assert sheet_fingerprint(before, 'B') == sheet_fingerprint(after, 'B')
+    assert sheet_fingerprint(before, 'C') == sheet_fingerprint(after, 'C')
+
+
+def test_changed_string_changes_fingerprint():
+    before = make_workbook([('A', ['x']), ('B', ['p'])])
+    after = make_workbook([('A', ['x']), ('B', ['q'])])
+
+    assert sheet_fingerprint(before, 'B') != sheet_fingerprint(after, 'B')
+
+
+def test_fingerprint_does_not_depend_on_chunk_size(monkeypatch):
+    workbook = make_workbook([('A', ['x', 'y', 'z']), ('B', ['p', 'q'])])
+    expected = sheet_fingerprint(workbook, 'B')
+
+    for size in (1, 7, 64):
+        monkeypatch.setattr(converters.excel, 'FINGERPRINT_CHUNK_SIZE', size)
+        assert sheet_fingerprint(workbook, 'B') == expected
@@ -0,0 +1,22 @@
+"""The Platypus and direct-canvas text converters lay out pages the same way"""
+import io
+
+from pypdf import PdfReader
+
+from converters.text import txt_to_pdf, txt_to_pdf_fast
+
+
+def page_count(converter, data):
+    return len(PdfReader(converter(io.BytesIO(data))).pages)
+
+
+def test_blank_lines_break_pages_like_platypus():
+    data = b'start\n' + b'\n' * 600 + b'end\n'
+
+    assert page_count(txt_to_pdf_fast, data) == page_count(txt_to_pdf, data)
+
+
+def test_mixed_text_and_blank_runs_break_pages_like_platypus():
+    data = b''.join(b'line %d of the file\n' % i + b'\n' * (i % 23) for i in range(300))
+
+    assert page_count(txt_to_pdf_fast, data) == page_count(txt_to_pdf, data)
@@ -0,0 +1,33 @@
+"""Word conversion of untrusted packages"""
+import io
+import zipfile
+
+import docx
+from pypdf import PdfReader
+
+from converters.word import docx_to_pdf
+
+
+def test_external_entities_are_not_expanded(tmp_path):
+    secret = tmp_path / 'secret.txt'
+    secret.write_text('TOP-SECRET-VALUE')
+    source = io.BytesIO()
+    document = docx.Document()
+    document.add_paragraph('MARKER')
+    document.save(source)
+
+    upload = io.BytesIO()
+    with zipfile.ZipFile(source) as original, zipfile.ZipFile(upload, 'w') as patched:
+        for info in original.infolist():
+            data = original.read(info)
+            if info.filename == 'word/document.xml':
+                declaration, body = data.split(b'?>', 1)
+                doctype = f'<!DOCTYPE w:document [<!ENTITY leak SYSTEM "file://{secret}">]>'.encode()
+                data = declaration + b'?>' + doctype + body.replace(b'MARKER', b'MARKER &leak;')
+            patched.writestr(info, data)
+    upload.seek(0)
+
+    text = ''.join(page.extract_text() for page in PdfReader(docx_to_pdf(upload)).pages)
+
+    assert 'MARKER' in text
+    assert 'TOP-SECRET-VALUE' not in text